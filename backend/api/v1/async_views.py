@@ -0,0 +1,267 @@
+"""
+    Асинхронный путь чтения для ASGI: лента рецептов, теги, ингредиенты.
+    В Django 3.2 нет асинхронного ORM, поэтому независимые запросы
+    выполняются в пуле потоков (у каждого потока своё соединение с БД)
+    и ожидаются одновременно через asyncio.gather.
+    Всё, что не относится к типовому чтению (запись, курсор, сортировка,
+    ошибки), передаётся синхронным ViewSet без изменений.
+    Обращения к django cache (memcached, redis) тоже блокирующие
+    и выполняются в пуле потоков.
+"""
+import asyncio
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.http import HttpResponse
+from django.urls import path
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.cache import recipe_response_cache
+from core.db.routers import (
+    choose_replica,
+    reset_replica,
+    use_database,
+    use_primary,
+)
+from recipes.interactions import (
+    EMPTY_INTERACTIONS,
+    UserInteractions,
+    cache_key,
+)
+from recipes.models import Recipe
+from .filters import RecipeFilter
+from .mixins import etag_response, patch_user_cache_headers, request_cache_key
+from .pagination import RecipePagination
+from .serializers import ReadRecipeSerializer
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+SYNC_ONLY_PARAMS = {'cursor', 'count', 'ordering', 'format'}
+
+
+def run_query(func, *args):
+    """
+        Выполняет блокирующий вызов ORM в пуле потоков.
+        Соединение потока закрывается по правилам CONN_MAX_AGE,
+        как в конце обычного запроса.
+    """
+    def call():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+def run_cache(func, *args):
+    """Выполняет блокирующее обращение к django cache в пуле потоков."""
+    return sync_to_async(func, thread_sensitive=False)(*args)
+
+
+def as_async(view):
+    return sync_to_async(view)
+
+
+def async_csrf_exempt(view):
+    """
+        csrf_exempt для async view: декоратор Django 3.2 оборачивает view
+        синхронной функцией. Как и в APIView.as_view, CSRF проверяет
+        аутентификация DRF view, которому передаётся запрос.
+    """
+    view.csrf_exempt = True
+    return view
+
+
+sync_recipes = as_async(
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+)
+sync_tags = as_async(TagViewSet.as_view({'get': 'list'}))
+sync_ingredients = as_async(IngredientViewSet.as_view({'get': 'list'}))
+
+
+def make_request(request):
+    return Request(
+        request,
+        authenticators=[
+            authentication()
+            for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        ],
+    )
+
+
+async def authenticate(request):
+    """Возвращает DRF Request с пользователем или None при ошибке."""
+    request = make_request(request)
+    try:
+        await run_query(lambda: request.user)
+    except APIException:
+        return None
+    return request
+
+
+async def load_interactions(request):
+    if not request.user.is_authenticated:
+        return EMPTY_INTERACTIONS
+    timeout = settings.USER_INTERACTIONS_CACHE_TIMEOUT
+    key = cache_key(request.user.pk)
+    interactions = await run_cache(cache.get, key) if timeout else None
+    if interactions is None:
+        querysets = UserInteractions.querysets(request.user)
+        values = await asyncio.gather(*(
+            run_query(list, queryset) for queryset in querysets.values()
+        ))
+        interactions = UserInteractions(**dict(zip(querysets, values)))
+        if timeout:
+            await run_cache(cache.set, key, interactions, timeout)
+    return interactions
+
+
+def page_links(request, page_number, page_size, count):
+    url = request.build_absolute_uri()
+    next_link = previous_link = None
+    if page_number * page_size < count:
+        next_link = replace_query_param(url, 'page', page_number + 1)
+    if page_number == 2:
+        previous_link = remove_query_param(url, 'page')
+    elif page_number > 2:
+        previous_link = replace_query_param(url, 'page', page_number - 1)
+    return next_link, previous_link
+
+
+async def render_recipe_page(request):
+    """
+        Страница ленты: количество, рецепты страницы и данные
+        пользователя загружаются одновременно.
+        Возвращает None, если ответ должен сформировать синхронный ViewSet.
+    """
+    filterset = RecipeFilter(
+        request.query_params, queryset=Recipe.objects.all(), request=request
+    )
+    if not await run_query(filterset.is_valid):
+        return None
+    queryset = await run_query(lambda: filterset.qs)
+    page_size = RecipePagination().get_page_size(request)
+    try:
+        page_number = int(request.query_params.get('page', 1))
+    except ValueError:
+        return None
+    if page_number < 1:
+        return None
+    offset = (page_number - 1) * page_size
+    count, recipes, interactions = await asyncio.gather(
+        run_query(queryset.count),
+        run_query(
+            lambda: list(queryset.for_read()[offset:offset + page_size])
+        ),
+        load_interactions(request),
+    )
+    if not recipes and page_number != 1:
+        return None
+    request._user_interactions = interactions
+    next_link, previous_link = page_links(
+        request, page_number, page_size, count
+    )
+    data = OrderedDict([
+        ('count', count),
+        ('next', next_link),
+        ('previous', previous_link),
+        ('results', ReadRecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data),
+    ])
+    return JSONRenderer().render(data)
+
+
+def cached_list_entry(request):
+    """Ключ ответа ленты в ResponseCache и запись или None."""
+    key = recipe_response_cache.list_key(request_cache_key(request))
+    return key, recipe_response_cache.get(key)
+
+
+@async_csrf_exempt
+async def recipe_list(request):
+    """Асинхронная лента рецептов /api/recipes/."""
+    if request.method != 'GET' or SYNC_ONLY_PARAMS & set(request.GET):
+        return await sync_recipes(request)
+    drf_request = await authenticate(request)
+    if drf_request is None:
+        return await sync_recipes(request)
+    timeout = settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+    public = not drf_request.user.is_authenticated and bool(timeout)
+    if public:
+        key, entry = await run_cache(cached_list_entry, drf_request)
+        if entry is not None:
+            return patch_user_cache_headers(
+                etag_response(drf_request, *entry), public=True
+            )
+        # Промах общего кэша заполняется с основной БД,
+        # как в синхронном view.
+        replica_token = use_primary()
+    elif settings.READ_REPLICAS:
+        replica_token = use_database(
+            await run_cache(choose_replica, drf_request.user)
+        )
+    else:
+        replica_token = use_primary()
+    try:
+        content = await render_recipe_page(drf_request)
+    finally:
+        reset_replica(replica_token)
+    if content is None:
+        return await sync_recipes(request)
+    if public:
+        entry = await run_cache(
+            recipe_response_cache.set, key, content, timeout
+        )
+        return patch_user_cache_headers(
+            etag_response(drf_request, *entry), public=True
+        )
+    return patch_user_cache_headers(
+        HttpResponse(content, content_type='application/json'),
+        public=False,
+    )
+
+
+async def cached_reference_list(request, view, viewset):
+    """
+        Справочники отдаются из ReferenceDataCache без обращения к БД,
+        при промахе ответ строит и кэширует синхронный ViewSet.
+    """
+    if request.method != 'GET' or 'format' in request.GET:
+        return await view(request)
+    drf_request = make_request(request)
+    reference_cache = viewset.reference_cache
+    entry = reference_cache.get(
+        request_cache_key(drf_request),
+        await run_cache(reference_cache.get_version),
+    )
+    if entry is None:
+        return await view(request)
+    return etag_response(drf_request, *entry)
+
+
+@async_csrf_exempt
+async def tag_list(request):
+    return await cached_reference_list(request, sync_tags, TagViewSet)
+
+
+@async_csrf_exempt
+async def ingredient_list(request):
+    return await cached_reference_list(
+        request, sync_ingredients, IngredientViewSet
+    )
+
+
+async_urlpatterns = [
+    path('recipes/', recipe_list, name='recipes-list-async'),
+    path('tags/', tag_list, name='tags-list-async'),
+    path('ingredients/', ingredient_list, name='ingredients-list-async'),
+]
@@ -0,0 +1,21 @@
+from rest_framework.authentication import TokenAuthentication
+
+from core.cache import token_cache
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+        TokenAuthentication без запроса к БД для известных токенов:
+        пользователь берётся из token_cache.
+        Кэш сбрасывается при удалении токена (logout),
+        сохранении и удалении пользователя; в других процессах -
+        только при общем CACHE_BACKEND.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is not None:
+            return user, self.get_model()(key=key, user=user)
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user)
+        return user, token
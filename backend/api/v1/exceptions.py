@@ -0,0 +1,28 @@
+from rest_framework.exceptions import ErrorDetail, ValidationError
+from rest_framework.views import exception_handler as drf_exception_handler
+
+
+# Код ошибок, значения которых - id объектов.
+ID_ERROR_CODE = 'object_id'
+
+
+def restore_ids(data):
+    """Возвращает id в ошибках с кодом ID_ERROR_CODE к числам."""
+    if isinstance(data, dict):
+        return {key: restore_ids(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [restore_ids(value) for value in data]
+    if isinstance(data, ErrorDetail) and data.code == ID_ERROR_CODE:
+        return int(data)
+    return data
+
+
+def exception_handler(exc, context):
+    """
+        Обработчик DRF, который отдаёт id в ошибках валидации числами:
+        ValidationError приводит все значения к строкам.
+    """
+    response = drf_exception_handler(exc, context)
+    if response is not None and isinstance(exc, ValidationError):
+        response.data = restore_ids(response.data)
+    return response
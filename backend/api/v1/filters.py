@@ -1,3 +1,4 @@
+from django import forms
 from django_filters.rest_framework import (
     filters,
     FilterSet,
@@ -5,37 +6,61 @@ from django_filters.rest_framework import (
 from recipes.models import (
     Ingredient,
     Recipe,
-    Tag,
 )
+from recipes.search import search_ingredients, search_recipes
+from recipes.tag_index import filter_by_tags
+
+
+class SlugMultipleField(forms.MultipleChoiceField):
+    """Список slug без проверки по choices (проверяет tag_index)."""
+
+    def valid_value(self, value):
+        return True
+
+
+class SlugMultipleFilter(filters.MultipleChoiceFilter):
+    field_class = SlugMultipleField
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='get_name')
 
     class Meta:
         model = Ingredient
         fields = ('name', )
 
+    def get_name(self, queryset, name, value):
+        return search_ingredients(queryset, value)
+
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug',
-    )
+    tags = SlugMultipleFilter(method='get_tags')
     is_favorited = filters.BooleanFilter(
         method='get_is_favorited'
     )
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author',
+            'tags',
+            'is_favorited',
+            'is_in_shopping_cart',
+            'search',
+        )
+
+    def get_tags(self, queryset, name, value):
+        return filter_by_tags(queryset, value)
 
     def get_is_favorited(self, queryset, name, value):
         return queryset.filter(favorites__user=self.request.user)
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         return queryset.filter(carts__user=self.request.user)
+
+    def get_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -1,15 +1,49 @@
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.transaction import atomic
+from django.http import HttpResponse, HttpResponseNotModified
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from recipes.models import Recipe
+from core.db.routers import (
+    pin_to_primary,
+    reset_replica,
+    use_primary,
+    use_replica,
+)
+from recipes.interactions import reset_interactions
+from recipes.models import (
+    BasketRecipe,
+    FavoriteRecipe,
+    Recipe,
+)
 
 
 class CreateDestroyObjMixinRecipe:
     """
         Используется для action методов RecipeViewSet.
         Используется для свяви между pk - рецепта и пользователем.
+        Поддерживает счётчики рецепта из COUNTER_FIELDS,
+        разошедшийся с таблицей счётчик не уходит ниже нуля.
     """
 
+    COUNTER_FIELDS = {
+        FavoriteRecipe: 'favorites_count',
+        BasketRecipe: 'carts_count',
+    }
+
+    def update_counter(self, model, recipe, delta):
+        field = self.COUNTER_FIELDS.get(model)
+        if field and delta:
+            Recipe.objects.filter(pk=recipe.pk).update(
+                **{field: Greatest(F(field) + delta, 0)}
+            )
+
     def mixin_create(self, request, serializer, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         serializer = serializer(
@@ -17,21 +51,196 @@ class CreateDestroyObjMixinRecipe:
             context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with atomic():
+            serializer.save()
+            self.update_counter(serializer.Meta.model, recipe, 1)
+        reset_interactions(request)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def mixin_destroy(self, request, model, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
-        if not model.objects.filter(
-            user=request.user, recipe=recipe
-        ).exists():
+        with atomic():
+            deleted, _ = model.objects.filter(
+                user=request.user, recipe=recipe
+            ).delete()
+            self.update_counter(model, recipe, -deleted)
+        reset_interactions(request)
+        if not deleted:
             return Response(
                 {
                     "error": "Удаляемой информации не обнаружено!"
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.filter(
-            user=request.user, recipe=recipe
-        ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def request_cache_key(request):
+    """Путь и нормализованная строка запроса: порядок параметров не важен."""
+    return (
+        request.path,
+        tuple(sorted(
+            (name, tuple(sorted(values)))
+            for name, values in request.query_params.lists()
+            if any(values)
+        )),
+    )
+
+
+def weak_etag(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(request, etag):
+    """
+        Слабое сравнение ETag со списком If-None-Match (RFC 7232):
+        теги сравниваются целиком, без учёта префикса W/, * совпадает
+        с любым тегом.
+    """
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    return weak_etag(etag) in {weak_etag(tag) for tag in etags}
+
+
+def etag_response(request, content, etag):
+    """Ответ с готовым JSON или 304, если клиент прислал тот же ETag."""
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def patch_user_cache_headers(response, public):
+    """
+        Ответ зависит от пользователя: анонимные ответы общие (public),
+        ответы авторизованным пользователям - private.
+    """
+    patch_vary_headers(response, ('Authorization', ))
+    if public:
+        patch_cache_control(
+            response, public=True, max_age=settings.RECIPE_CACHE_MAX_AGE
+        )
+    else:
+        patch_cache_control(response, private=True)
+    return response
+
+
+class ReplicaReadMixin:
+    """
+        Используется для ViewSet с тяжёлым чтением.
+        Безопасные запросы читают с реплик из READ_REPLICAS,
+        успешная запись закрепляет пользователя за основной БД
+        на REPLICA_STICKINESS_SECONDS.
+    """
+
+    replica_token = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self.replica_token = use_replica(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.replica_token is not None:
+            reset_replica(self.replica_token)
+            self.replica_token = None
+        elif (
+            request.method not in SAFE_METHODS
+            and status.is_success(response.status_code)
+        ):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReferenceDataCacheMixin:
+    """
+        Используется для ViewSet справочных данных (теги, ингредиенты).
+        Отдаёт list/retrieve из ReferenceDataCache с поддержкой ETag.
+    """
+
+    reference_cache = None
+
+    def get_cache_key(self, request):
+        return request_cache_key(request)
+
+    def cached_response(self, request, view_method, *args, **kwargs):
+        version = self.reference_cache.get_version()
+        key = self.get_cache_key(request)
+        entry = self.reference_cache.get(key, version)
+        if entry is None:
+            response = view_method(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = self.reference_cache.set(
+                key, version, JSONRenderer().render(response.data)
+            )
+        return etag_response(request, *entry)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+
+class AnonymousResponseCacheMixin:
+    """
+        Используется для RecipeViewSet.
+        Ответы list/retrieve анонимным пользователям не зависят
+        от пользователя, поэтому отдаются из ResponseCache с ETag.
+        Ответы авторизованным пользователям не кэшируются.
+        Промах заполняется с основной БД: ответ отстающей реплики
+        сохранился бы под уже увеличенной после записи версией.
+    """
+
+    response_cache = None
+
+    def cached_response(self, request, view_method, *args, **kwargs):
+        timeout = settings.RECIPE_RESPONSE_CACHE_TIMEOUT
+        pk = kwargs.get('pk')
+        if pk is not None and not str(pk).isdigit():
+            timeout = 0
+        if request.user.is_authenticated or not timeout:
+            return patch_user_cache_headers(
+                view_method(request, *args, **kwargs), public=False
+            )
+        request_key = request_cache_key(request)
+        if pk is not None:
+            key = self.response_cache.object_key(int(pk), request_key)
+        else:
+            key = self.response_cache.list_key(request_key)
+        entry = self.response_cache.get(key)
+        if entry is None:
+            token = use_primary()
+            try:
+                response = view_method(request, *args, **kwargs)
+            finally:
+                reset_replica(token)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = self.response_cache.set(
+                key, JSONRenderer().render(response.data), timeout
+            )
+        return patch_user_cache_headers(
+            etag_response(request, *entry), public=True
+        )
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs
+        )
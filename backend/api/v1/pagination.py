@@ -0,0 +1,136 @@
+import base64
+import re
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class RecipePagination(PageNumberPagination):
+    """
+        Постраничная пагинация ленты рецептов.
+        С параметром ?cursor= включается keyset-режим по (pub_date, id):
+        страница выбирается без OFFSET, общее количество не считается,
+        если не запрошено ?count=exact|approximate.
+        Курсор с другой сортировкой (?ordering=, ранжирование поиска)
+        отклоняется с ошибкой 400, а не заменяется молча на ключ курсора.
+    """
+
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    # Поля ключа (дата публикации, id рецепта), по убыванию.
+    cursor_fields = ('pub_date', 'id')
+    invalid_cursor_message = 'Неверный курсор.'
+    cursor_ordering_message = (
+        'Курсор нельзя совмещать с сортировкой или поиском.'
+    )
+
+    def is_cursor_request(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.is_cursor_request(request)
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        page_size = self.get_page_size(request)
+        date_field, id_field = self.cursor_fields
+        ordering = (f'-{date_field}', f'-{id_field}')
+        if queryset.query.order_by not in ((), ordering[:1], ordering):
+            raise ValidationError(
+                {self.cursor_query_param: self.cursor_ordering_message}
+            )
+        queryset = queryset.order_by(*ordering)
+        self.count = self.get_count(
+            queryset, request.query_params.get(self.count_query_param)
+        )
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param)
+        )
+        if position is not None:
+            pub_date, pk = position
+            # Избыточное условие pub_date <= X задаёт границу
+            # диапазона индекса, OR ниже её не даёт.
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lte': pub_date}),
+                Q(**{f'{date_field}__lt': pub_date})
+                | Q(**{date_field: pub_date, f'{id_field}__lt': pk}),
+            )
+        page = list(queryset[:page_size + 1])
+        self.next_position = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_position = (
+                getattr(page[-1], date_field), getattr(page[-1], id_field)
+            )
+        return page
+
+    def get_count(self, queryset, mode):
+        if mode == 'exact':
+            return queryset.count()
+        if mode != 'approximate':
+            return None
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.count()
+        match = re.search(r'rows=(\d+)', queryset.order_by().explain())
+        return int(match.group(1)) if match else None
+
+    def encode_cursor(self, position):
+        pub_date, pk = position
+        return base64.urlsafe_b64encode(
+            f'{pub_date.isoformat()}|{pk}'.encode()
+        ).decode()
+
+    def decode_cursor(self, value):
+        if not value:
+            return None
+        try:
+            pub_date, pk = base64.urlsafe_b64decode(
+                value.encode()
+            ).decode().split('|')
+            pub_date = parse_datetime(pub_date)
+            pk = int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_date, pk
+
+    def get_next_cursor_link(self):
+        if self.next_position is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position)
+        )
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        response = OrderedDict([
+            ('next', self.get_next_cursor_link()),
+            ('results', data),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+            response.move_to_end('count', last=False)
+        return Response(response)
+
+
+class FeedPagination(RecipePagination):
+    """Лента подписок: всегда keyset-режим."""
+
+    def is_cursor_request(self, request):
+        return True
+
+
+class TimelinePagination(FeedPagination):
+    """Keyset по полям материализованной ленты FeedEntry."""
+
+    cursor_fields = ('feed_pub_date', 'feed_recipe_id')
@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """
+        Базовый класс выгрузки списка покупок.
+        Наследники реализуют stream() - генератор байтовых чанков.
+    """
+
+    charset = 'utf-8'
+    filename = 'shopping_list'
+    chunk_size = 64
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+    def chunked(self, lines):
+        chunk = []
+        for line in lines:
+            chunk.append(line)
+            if len(chunk) >= self.chunk_size:
+                yield ''.join(chunk).encode(self.charset)
+                chunk = []
+        if chunk:
+            yield ''.join(chunk).encode(self.charset)
+
+    def stream(self, recipes, ingredients):
+        raise NotImplementedError(
+            'ShoppingListRenderer.stream() must be implemented.'
+        )
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def lines(self, recipes, ingredients):
+        yield 'Меню для приготовления:\n\n'
+        for name in recipes:
+            yield f'{name}\n'
+        yield '\n-------------------------------------\n\n'
+        yield 'Список покупок:\n\n'
+        for ingredient in ingredients:
+            yield (
+                f'{ingredient["name"]} - '
+                f'{ingredient["measurement_unit"]}, '
+                f'{ingredient["ingredient_amount"]}\n'
+            )
+
+    def stream(self, recipes, ingredients):
+        return self.chunked(self.lines(recipes, ingredients))
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    class Echo:
+        def write(self, value):
+            return value
+
+    def lines(self, recipes, ingredients):
+        writer = csv.writer(self.Echo())
+        yield writer.writerow(
+            ['Ингредиент', 'Единица измерения', 'Количество']
+        )
+        for ingredient in ingredients:
+            yield writer.writerow([
+                ingredient['name'],
+                ingredient['measurement_unit'],
+                ingredient['ingredient_amount'],
+            ])
+
+    def stream(self, recipes, ingredients):
+        return self.chunked(self.lines(recipes, ingredients))
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 12
+    margin = 50
+    byte_chunk_size = 8192
+
+    def register_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_FONT)
+            )
+
+    def begin_text(self, pdf):
+        text = pdf.beginText(self.margin, A4[1] - self.margin)
+        text.setFont(self.font_name, self.font_size)
+        text.setLeading(self.font_size * 1.5)
+        return text
+
+    def stream(self, recipes, ingredients):
+        self.register_font()
+        buffer = io.BytesIO()
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        text = self.begin_text(pdf)
+        lines = TxtShoppingListRenderer().lines(recipes, ingredients)
+        for chunk in lines:
+            for line in chunk.splitlines():
+                if text.getY() < self.margin:
+                    pdf.drawText(text)
+                    pdf.showPage()
+                    text = self.begin_text(pdf)
+                text.textLine(line)
+        pdf.drawText(text)
+        pdf.save()
+        buffer.seek(0)
+        while True:
+            data = buffer.read(self.byte_chunk_size)
+            if not data:
+                break
+            yield data
+
+
+SHOPPING_LIST_RENDERERS = [
+    TxtShoppingListRenderer,
+    CsvShoppingListRenderer,
+    PdfShoppingListRenderer,
+]
+
+
+class ShoppingListContentNegotiation(DefaultContentNegotiation):
+    """
+        Формат выгрузки выбирается параметром ?format=txt|csv|pdf,
+        неизвестный формат - 404. Без параметра отдаётся
+        первый формат, если Accept не подходит ни к одному.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        file_format = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE
+        )
+        if file_format:
+            renderer = self.filter_renderers(renderers, file_format)[0]
+            return renderer, renderer.media_type
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except NotAcceptable:
+            return renderers[0], renderers[0].media_type
@@ -1,10 +1,17 @@
 import base64
+import binascii
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db.transaction import atomic
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
+from core.middleware import measure_serialization
+from recipes.images import discard_variants, schedule_image_processing
+from recipes.interactions import get_interactions
 from recipes.models import (
     BasketRecipe,
     Tag,
@@ -12,25 +19,67 @@ from recipes.models import (
     IngredientAmount,
     Recipe,
     FavoriteRecipe,
+    ShoppingListItem,
 )
 from users.models import FollowingAuthor
+from .exceptions import ID_ERROR_CODE
 
 
 User = get_user_model()
 
+# Предел IngredientAmount.amount (PositiveSmallIntegerField).
+MAX_INGREDIENT_AMOUNT = 32767
+
+
+class SerializationMetricsMixin:
+    """Время to_representation попадает в метрику сериализации запроса."""
+
+    def to_representation(self, instance):
+        with measure_serialization(self.context.get('request')):
+            return super().to_representation(instance)
+
 
 class Base64ImageField(serializers.ImageField):
+    """
+        Поле изображения в base64.
+        Размер проверяется по длине строки до декодирования.
+    """
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
+            if len(data) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(
+                    'Размер изображения не должен превышать '
+                    f'{settings.RECIPE_IMAGE_MAX_SIZE} байт.'
+                )
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                decoded = base64.b64decode(imgstr)
+            except binascii.Error:
+                raise serializers.ValidationError(
+                    'Некорректные данные изображения.'
+                )
+            data = ContentFile(decoded, name='temp.' + ext)
 
         return super().to_internal_value(data)
 
 
-class UserSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на WebP варианты изображения рецепта."""
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        variants = {}
+        for variant, name in value.items():
+            url = default_storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            variants[variant] = url
+        return variants
+
+
+class UserSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
     """
         Serializer для управления пользователями.
     """
@@ -49,16 +98,13 @@ class UserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        return (
-            request.user.is_authenticated
-            and FollowingAuthor.objects.filter(
-                user=request.user, author=obj
-            ).exists()
-        )
+        return obj.pk in get_interactions(request).following
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
     """
         Serializer для тегов.
     """
@@ -73,7 +119,10 @@ class TagSerializer(serializers.ModelSerializer):
         ]
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для ингредиентов.
     """
@@ -87,7 +136,10 @@ class IngredientSerializer(serializers.ModelSerializer):
         ]
 
 
-class IngredientAmountSerializer(serializers.ModelSerializer):
+class IngredientAmountSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для ингредиентов и их содержание в рецепте.
     """
@@ -109,7 +161,19 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         ]
 
 
-class CreateIngredientAmountSerializer(serializers.ModelSerializer):
+class ShoppingListItemSerializer(IngredientAmountSerializer):
+    """
+        Serializer для позиций материализованного списка покупок.
+    """
+
+    class Meta(IngredientAmountSerializer.Meta):
+        model = ShoppingListItem
+
+
+class CreateIngredientAmountSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     id = serializers.IntegerField()
 
     class Meta:
@@ -117,7 +181,7 @@ class CreateIngredientAmountSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(SerializationMetricsMixin, serializers.ModelSerializer):
     """
         Serializer для создания/изменения кулинарных рецептов.
     """
@@ -137,20 +201,43 @@ class RecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         ]
 
+    def validate_ingredients(self, value):
+        """
+            Объединяет повторяющиеся id и загружает все ингредиенты
+            одним запросом. Неизвестные id возвращаются списком.
+        """
+        amounts = {}
+        for item in value:
+            amounts[item['id']] = amounts.get(item['id'], 0) + item['amount']
+        too_large = [
+            pk for pk, amount in amounts.items()
+            if amount > MAX_INGREDIENT_AMOUNT
+        ]
+        if too_large:
+            raise serializers.ValidationError(
+                f'Количество ингредиентов {too_large} '
+                f'больше {MAX_INGREDIENT_AMOUNT}.'
+            )
+        ingredients = Ingredient.objects.in_bulk(list(amounts))
+        missing_ids = [pk for pk in amounts if pk not in ingredients]
+        if missing_ids:
+            raise serializers.ValidationError({
+                'detail': 'Ингредиенты не найдены.',
+                'missing_ids': serializers.ValidationError(
+                    missing_ids, code=ID_ERROR_CODE
+                ).detail,
+            })
+        return [
+            {'ingredient': ingredients[pk], 'amount': amount}
+            for pk, amount in amounts.items()
+        ]
+
     @staticmethod
     def create_ingredient_amount(recipe, ingredients):
-        objs = []
-        for ing in ingredients:
-            id, amount = ing.values()
-            ingredient = Ingredient.objects.get(id=id)
-            objs.append(
-                IngredientAmount(
-                    recipe=recipe,
-                    ingredient=ingredient,
-                    amount=amount
-                )
-            )
-        IngredientAmount.objects.bulk_create(objs)
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, **ingredient)
+            for ingredient in ingredients
+        )
 
     @atomic
     def create(self, validated_data):
@@ -160,29 +247,72 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=request.user, **validated_data)
         recipe.tags.set(tags)
         self.create_ingredient_amount(recipe, ingredients)
+        schedule_image_processing(recipe)
+        # Поисковый вектор с ингредиентами пересчитывается после коммита
+        # по сигналу post_save рецепта.
         return recipe
 
+    @staticmethod
+    def update_ingredient_amount(recipe, ingredients):
+        """
+            Приводит ингредиенты рецепта к переданному списку,
+            изменяя только добавленные, удалённые и изменённые строки.
+            Возвращает изменения количества {ingredient_id: delta}.
+        """
+        current = {
+            amount.ingredient_id: amount
+            for amount in recipe.ingredientamounts.all()
+        }
+        to_create, to_update, deltas = [], [], {}
+        for item in ingredients:
+            amount = current.pop(item['ingredient'].id, None)
+            if amount is None:
+                to_create.append(IngredientAmount(recipe=recipe, **item))
+                deltas[item['ingredient'].id] = item['amount']
+            elif amount.amount != item['amount']:
+                deltas[amount.ingredient_id] = item['amount'] - amount.amount
+                amount.amount = item['amount']
+                to_update.append(amount)
+        IngredientAmount.objects.bulk_create(to_create)
+        IngredientAmount.objects.bulk_update(to_update, ['amount'])
+        if current:
+            IngredientAmount.objects.filter(
+                pk__in=[amount.pk for amount in current.values()]
+            ).delete()
+            for ingredient_id, amount in current.items():
+                deltas[ingredient_id] = -amount.amount
+        return deltas
+
     @atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        super().update(instance, validated_data)
-        self.create_ingredient_amount(instance, ingredients)
-        instance.save()
-        return instance
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            discard_variants(instance)
+            validated_data['image_variants'] = {}
+            schedule_image_processing(instance)
+        if tags is not None:
+            instance.tags.set(tags)
+        if ingredients is not None:
+            deltas = self.update_ingredient_amount(instance, ingredients)
+            ShoppingListItem.objects.apply_deltas(
+                instance.carts.values_list('user_id', flat=True), deltas
+            )
+        return super().update(instance, validated_data)
 
     def to_representation(self, instance):
         request = self.context.get('request')
+        instance = Recipe.objects.for_read().get(pk=instance.pk)
         return ReadRecipeSerializer(
             instance,
             context={'request': request}
         ).data
 
 
-class ReadRecipeSerializer(serializers.ModelSerializer):
+class ReadRecipeSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для получения полной информации о рецепте.
     """
@@ -192,6 +322,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -204,47 +335,51 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
-            'cooking_time'
+            'cooking_time',
+            'favorites_count',
+            'carts_count'
         ]
 
     def get_is_favorited(self, obj):
         request = self.context.get('request')
-        if not request.user.is_authenticated:
-            return False
-        return FavoriteRecipe.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return obj.pk in get_interactions(request).favorites
 
     def get_is_in_shopping_cart(self, obj):
         request = self.context.get('request')
-        if not request.user.is_authenticated:
-            return False
-        return BasketRecipe.objects.filter(
-            user=request.user, recipe=obj
-        ).exists()
+        return obj.pk in get_interactions(request).carts
 
     def get_ingredients(self, obj):
-        ingredients = IngredientAmount.objects.filter(recipe=obj)
+        ingredients = obj.ingredientamounts.all()
         return IngredientAmountSerializer(ingredients, many=True).data
 
 
-class MinRecipeSerializer(serializers.ModelSerializer):
+class MinRecipeSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для получения краткой информации о рецепте.
     """
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = [
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         ]
 
 
-class FavoriteRecipeSerializer(serializers.ModelSerializer):
+class FavoriteRecipeSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для добавления избранных рецептов.
     """
@@ -303,15 +438,12 @@ class ReprFollowingAuthorSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None:
             return True
-        return (
-            request.user.is_authenticated
-            and FollowingAuthor.objects.filter(
-                user=request.user, author=obj
-            ).exists()
-        )
+        return obj.pk in get_interactions(request).following
 
     def get_recipes(self, obj):
         request = self.context.get('request')
@@ -319,7 +451,7 @@ class ReprFollowingAuthorSerializer(UserSerializer):
         if request:
             recipes_limit = request.query_params.get('recipes_limit')
         recipes = obj.recipes.all()
-        if recipes_limit:
+        if recipes_limit and recipes_limit.isdigit():
             recipes = obj.recipes.all()[:int(recipes_limit)]
         return MinRecipeSerializer(
             recipes,
@@ -328,10 +460,15 @@ class ReprFollowingAuthorSerializer(UserSerializer):
         ).data
 
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
 
-class FollowingAuthorSerializer(serializers.ModelSerializer):
+class FollowingAuthorSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для подписки на авторов рецептов.
     """
@@ -363,7 +500,10 @@ class FollowingAuthorSerializer(serializers.ModelSerializer):
         ).data
 
 
-class BasketRecipeSerializer(serializers.ModelSerializer):
+class BasketRecipeSerializer(
+    SerializationMetricsMixin,
+    serializers.ModelSerializer
+):
     """
         Serializer для добавления добавления рецептов в список покупок.
     """
@@ -1,4 +1,5 @@
-from . import views
+from . import async_views, views
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import SimpleRouter
 
@@ -29,3 +30,6 @@ router.register(
 urlpatterns = [
     path('', include(router.urls)),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = async_views.async_urlpatterns + urlpatterns
@@ -1,5 +1,15 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.db.models import (
+    BooleanField,
+    Count,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Value,
+    prefetch_related_objects,
+)
+from django.http.response import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -8,16 +18,21 @@ from rest_framework import (
     viewsets,
 )
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import (
+    AllowAny,
+    IsAuthenticated,
+)
 from rest_framework.response import Response
 
+from recipes.interactions import get_interactions, reset_interactions
 from recipes.models import (
     BasketRecipe,
     FavoriteRecipe,
     Ingredient,
-    IngredientAmount,
     Recipe,
+    ShoppingListItem,
     Tag,
     User,
 )
@@ -28,8 +43,27 @@ from .filters import (
     IngredientFilter,
     RecipeFilter,
 )
-from .mixins import CreateDestroyObjMixinRecipe
+from core.cache import (
+    ingredients_cache,
+    recipe_response_cache,
+    tags_cache,
+)
+from .mixins import (
+    AnonymousResponseCacheMixin,
+    CreateDestroyObjMixinRecipe,
+    ReferenceDataCacheMixin,
+    ReplicaReadMixin,
+)
+from .pagination import (
+    FeedPagination,
+    RecipePagination,
+    TimelinePagination,
+)
 from .permissions import IsAdminAuthorOrReadOnly
+from .renderers import (
+    SHOPPING_LIST_RENDERERS,
+    ShoppingListContentNegotiation,
+)
 from .serializers import (
     BasketRecipeSerializer,
     FavoriteRecipeSerializer,
@@ -38,11 +72,12 @@ from .serializers import (
     ReadRecipeSerializer,
     RecipeSerializer,
     ReprFollowingAuthorSerializer,
+    ShoppingListItemSerializer,
     TagSerializer,
 )
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, UserViewSet):
     """ViewSet для управлением пользователями."""
 
     queryset = User.objects.all()
@@ -69,6 +104,7 @@ class CustomUserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            reset_interactions(request)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if not FollowingAuthor.objects.filter(
@@ -83,6 +119,7 @@ class CustomUserViewSet(UserViewSet):
         FollowingAuthor.objects.filter(
             user=request.user, author=author
         ).delete()
+        reset_interactions(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'])
@@ -98,14 +135,35 @@ class CustomUserViewSet(UserViewSet):
                 },
                 status=status.HTTP_401_UNAUTHORIZED
             )
-        data = User.objects.filter(following__user=self.request.user)
-        serializer = ReprFollowingAuthorSerializer(data, many=True)
-        return self.get_paginated_response(
-            self.paginate_queryset(serializer.data)
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).annotate(
+            recipes_count=Count('recipes'),
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).order_by('id')
+        page = self.paginate_queryset(queryset)
+        recipes = Recipe.objects.order_by('-pub_date')
+        recipes_limit = request.query_params.get('recipes_limit')
+        if recipes_limit and recipes_limit.isdigit():
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(
+                        author=OuterRef('author')
+                    ).order_by('-pub_date').values('pk')[:int(recipes_limit)]
+                )
+            )
+        prefetch_related_objects(page, Prefetch('recipes', queryset=recipes))
+        serializer = ReprFollowingAuthorSerializer(
+            page, many=True, context={'request': request}
         )
+        return self.get_paginated_response(serializer.data)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(
+    ReplicaReadMixin,
+    ReferenceDataCacheMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """
         ViewSet получения тегов(тега).
         Изменение и создание тэгов разрешено только администраторам.
@@ -113,11 +171,16 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    reference_cache = tags_cache
     permission_classes = (AllowAny, )
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(
+    ReplicaReadMixin,
+    ReferenceDataCacheMixin,
+    viewsets.ReadOnlyModelViewSet
+):
     """
         ViewSet получения ингредиентов(ингредиента).
         Изменение и создание ингредиентов разрешено только администраторам.
@@ -125,6 +188,7 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    reference_cache = ingredients_cache
     permission_classes = (AllowAny, )
     pagination_class = None
     filter_backends = [DjangoFilterBackend]
@@ -132,16 +196,27 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class RecipeViewSet(
+    ReplicaReadMixin,
+    AnonymousResponseCacheMixin,
     viewsets.ModelViewSet,
     CreateDestroyObjMixinRecipe
 ):
     """ViewSet для работы с кулинарными рецептами."""
 
     queryset = Recipe.objects.all()
+    response_cache = recipe_response_cache
     permission_classes = [IsAdminAuthorOrReadOnly]
     http_method_names = ['get', 'post', 'patch', 'delete']
-    filter_backends = [DjangoFilterBackend]
+    pagination_class = RecipePagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'carts_count')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('retrieve', 'list'):
+            return queryset.for_read()
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ('retrieve', 'list'):
@@ -166,36 +241,91 @@ class RecipeViewSet(
             return self.mixin_create(request, BasketRecipeSerializer, pk)
         return self.mixin_destroy(request, BasketRecipe, pk)
 
-    @action(detail=False, methods=['GET'])
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+    )
+    def feed(self, request):
+        """
+            Новые рецепты авторов, на которых подписан пользователь,
+            постранично по ?cursor=. При большом числе подписок читается
+            материализованная лента FeedEntry.
+        """
+        threshold = settings.FEED_TIMELINE_THRESHOLD
+        if threshold and len(get_interactions(request).following) >= threshold:
+            queryset = Recipe.objects.filter(
+                feed_entries__user=request.user
+            ).annotate(
+                feed_pub_date=F('feed_entries__pub_date'),
+                feed_recipe_id=F('feed_entries__recipe'),
+            )
+            paginator = TimelinePagination()
+        else:
+            queryset = Recipe.objects.filter(
+                author__following__user=request.user
+            )
+            paginator = FeedPagination()
+        page = paginator.paginate_queryset(
+            queryset.for_read(), request, view=self
+        )
+        serializer = ReadRecipeSerializer(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_list(self, request):
+        """
+            Список покупок: суммарное количество ингредиентов
+            всех рецептов корзины.
+        """
+        items = ShoppingListItem.objects.filter(
+            user=request.user
+        ).select_related('ingredient').order_by('ingredient__name')
+        return Response(ShoppingListItemSerializer(items, many=True).data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        content_negotiation_class=ShoppingListContentNegotiation,
+    )
     def download_shopping_cart(self, request):
         """
-            Выгрузка PDF файла со списком покупок.
+            Выгрузка списка покупок в формате ?format=txt|csv|pdf.
+            Файл отдаётся потоком, ингредиенты читаются
+            из материализованного списка покупок.
+            Строки загружаются до ответа: под ASGI тело отдаётся
+            из event loop, где синхронный ORM недоступен.
         """
-        user = self.request.user
-        if not user.carts.exists():
+        recipes = list(
+            Recipe.objects.filter(
+                carts__user=request.user
+            ).values_list('name', flat=True)
+        )
+        if not recipes:
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
-        basket_recipes = BasketRecipe.objects.filter(user=request.user)
-        ingredients = IngredientAmount.objects.filter(
-            recipe__carts__user=request.user
+        ingredients = ShoppingListItem.objects.filter(
+            user=request.user
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount'))
-        shopping = ['Меню для приготовления:\n\n']
-        for rcp in basket_recipes:
-            shopping.append(f'{rcp.recipe.name}\n')
-        shopping.append('\n-------------------------------------\n\n')
-        shopping.append('Список покупок:\n\n')
-        for ingredient in ingredients:
-            shopping.append(
-                f'{ingredient["ingredient__name"]} - '
-                f'{ingredient["ingredient__measurement_unit"]}, '
-                f'{ingredient["ingredient_amount"]}\n'
-            )
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'),
+            ingredient_amount=F('amount'),
+        ).order_by('name')
 
-        filename = "shopping_list.txt"
-        response = HttpResponse(
-            shopping, content_type="text.txt; charset=utf-8"
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(recipes, list(ingredients)),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response["Content-Disposition"] = (
+            f"attachment; filename={renderer.get_filename()}"
         )
-        response["Content-Disposition"] = f"attachment; filename={filename}"
         return response
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,17 +75,87 @@ WSGI_APPLICATION = 'backend.wsgi.application'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
 
+# DB_CONN_MAX_AGE - время жизни постоянного соединения (0 - на запрос).
+# DB_HEALTH_CHECKS - проверять повторно используемые соединения.
+# DB_POOL_SIZE > 0 включает общий пул соединений процесса
+# (соединение возвращается в пул в конце каждого запроса),
+# DB_POOL_TIMEOUT - сколько ждать свободного соединения.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': (
+            0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        'HEALTH_CHECKS': os.getenv('DB_HEALTH_CHECKS', 'True') == 'True',
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        },
+    }
+}
+
+# DB_REPLICA_HOSTS - хосты реплик через запятую. GET запросы API читают
+# с реплик, после записи пользователь REPLICA_STICKINESS_SECONDS
+# читает с основной БД. Закрепление хранится в django cache,
+# поэтому с репликами нужен общий для процессов CACHE_BACKEND.
+READ_REPLICAS = []
+for number, host in enumerate(
+    host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host
+):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    READ_REPLICAS.append(alias)
+DATABASE_ROUTERS = ['core.db.routers.ReplicaRouter']
+REPLICA_STICKINESS_SECONDS = int(os.getenv('REPLICA_STICKINESS_SECONDS', 5))
+
+# Неключевые столбцы покрывающих индексов (include) есть только в PostgreSQL,
+# на других СУБД они просто не создаются.
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
     }
 }
 
+# Срок, за который теги и ингредиенты в памяти процессов обновляются
+# после изменений из других процессов (0 - только по версии в кэше).
+REFERENCE_DATA_CACHE_TIMEOUT = int(
+    os.getenv('REFERENCE_DATA_CACHE_TIMEOUT', 60)
+)
+
+USER_INTERACTIONS_CACHE_TIMEOUT = int(
+    os.getenv('USER_INTERACTIONS_CACHE_TIMEOUT', 0)
+)
+# Срок ответов рецептов анонимным пользователям. Добавление в избранное
+# и корзину не сбрасывает списки: их счётчики отстают не дольше этого срока.
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', 300)
+)
+RECIPE_CACHE_MAX_AGE = int(os.getenv('RECIPE_CACHE_MAX_AGE', 0))
+
+# С этого числа подписок лента /api/recipes/feed/ пользователя
+# материализуется при публикации рецептов (0 - всегда собирать при чтении).
+FEED_TIMELINE_THRESHOLD = int(os.getenv('FEED_TIMELINE_THRESHOLD', 1000))
+
+# Асинхронные view чтения рецептов, тегов и ингредиентов (под ASGI).
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -103,6 +174,16 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Кэш пользователей по токену: время жизни записи (0 - выключен),
+# размер LRU в памяти процесса и хранение в общем django cache.
+# Сброс записей (logout, смена пароля) виден другим процессам только
+# через общий CACHE_BACKEND, поэтому без него кэш по умолчанию выключен.
+TOKEN_CACHE_TIMEOUT = int(
+    os.getenv('TOKEN_CACHE_TIMEOUT', 60 if os.getenv('CACHE_BACKEND') else 0)
+)
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+TOKEN_CACHE_SHARED = os.getenv('TOKEN_CACHE_SHARED', 'False') == 'True'
+
 REST_FRAMEWORK = {
 
     'DEFAULT_PERMISSION_CLASSES': [
@@ -110,11 +191,13 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.v1.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
+
+    'EXCEPTION_HANDLER': 'api.v1.exceptions.exception_handler',
 }
 
 DJOSER = {
@@ -155,6 +238,27 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 AUTH_USER_MODEL = 'users.User'
 
+METRICS_DEBUG_HEADERS = DEBUG
+# Адреса, с которых доступен /metrics/; пустой список закрывает его.
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+    if ip
+]
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0.5))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024)
+)
+# Очередь обработки изображений живёт в памяти процесса и теряется
+# при перезапуске воркера: пропущенные варианты создаёт
+# manage.py regenerate_image_variants.
+IMAGE_PROCESSING_ASYNC = (
+    os.getenv('IMAGE_PROCESSING_ASYNC', 'False') == 'True'
+)
+IMAGE_PROCESSING_WORKERS = int(os.getenv('IMAGE_PROCESSING_WORKERS', 2))
+
+SHOPPING_LIST_FONT = os.path.join(BASE_DIR, 'static/fonts/DejaVuSans.ttf')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
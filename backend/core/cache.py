@@ -0,0 +1,227 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class CacheVersion:
+    """
+        Счётчик версии данных в django cache.
+        Используется для инвалидации кэшей в памяти процессов.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f'reference-data:{name}:version'
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 1, timeout=None)
+            version = cache.get(self.version_key, 1)
+        return version
+
+    def bump(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, timeout=None)
+
+
+class ReferenceDataCache(CacheVersion):
+    """
+        Кэш сериализованных справочных данных (теги, ингредиенты).
+        Хранит готовые JSON байты в памяти процесса, актуальность
+        определяется счётчиком версии в django cache.
+        Счётчик в locmem кэше виден только своему процессу, поэтому
+        записи живут не дольше REFERENCE_DATA_CACHE_TIMEOUT секунд:
+        изменения из других процессов (manage.py) видны не позже,
+        чем через это время. ETag зависит только от версии и содержимого
+        и после перестроения записи с теми же данными не меняется.
+    """
+
+    max_entries = 1024
+
+    def __init__(self, name):
+        super().__init__(name)
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def deadline(self):
+        """Момент, после которого данные в памяти процесса устаревают."""
+        timeout = settings.REFERENCE_DATA_CACHE_TIMEOUT
+        return time.monotonic() + timeout if timeout else None
+
+    @staticmethod
+    def expired(deadline):
+        return deadline is not None and time.monotonic() >= deadline
+
+    def bump(self):
+        super().bump()
+        with self._lock:
+            self._entries.clear()
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if self.expired(entry[2]):
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[:2]
+
+    def set(self, key, version, content):
+        etag = '"{}-{}"'.format(
+            version, hashlib.md5(content).hexdigest()
+        )
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = (content, etag, self.deadline())
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return content, etag
+
+
+class ResponseCache(CacheVersion):
+    """
+        Кэш готовых ответов API в django cache (общий для процессов
+        при memcached/redis бэкенде).
+        Ключ записи включает общую версию и версию раздела:
+        списка или отдельного объекта. Инвалидация - увеличение
+        счётчика версии, устаревшие записи вытесняются по timeout.
+    """
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.list_version = CacheVersion(f'{name}-list')
+
+    def object_version(self, pk):
+        return CacheVersion(f'{self.name}-{pk}')
+
+    def make_key(self, scope, scope_version, request_key):
+        digest = hashlib.md5(repr(request_key).encode()).hexdigest()
+        return (
+            f'response:{self.name}:{self.get_version()}:'
+            f'{scope}:{scope_version}:{digest}'
+        )
+
+    def list_key(self, request_key):
+        return self.make_key(
+            'list', self.list_version.get_version(), request_key
+        )
+
+    def object_key(self, pk, request_key):
+        return self.make_key(
+            pk, self.object_version(pk).get_version(), request_key
+        )
+
+    def get(self, key):
+        return cache.get(key)
+
+    def set(self, key, content, timeout):
+        etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+        cache.set(key, (content, etag), timeout)
+        return content, etag
+
+    def invalidate(self, pks, lists=True):
+        """Сбрасывает ответы для объектов pks и, если lists, все списки."""
+        for pk in pks:
+            self.object_version(pk).bump()
+        if lists:
+            self.list_version.bump()
+
+
+class TokenCache:
+    """
+        Кэш пользователей по ключу токена авторизации.
+        LRU в памяти процесса: не более TOKEN_CACHE_MAX_ENTRIES записей,
+        каждая живёт TOKEN_CACHE_TIMEOUT секунд (0 - кэш выключен).
+        При TOKEN_CACHE_SHARED записи также хранятся в django cache.
+        Запись действительна, пока не изменилась версия пользователя
+        в django cache. Инвалидация видна всем процессам только
+        при общем бэкенде, с LocMemCache другие процессы отдают
+        запись до истечения TOKEN_CACHE_TIMEOUT (проверка core.W002).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def user_version(self, user_id):
+        return CacheVersion(f'auth-user-{user_id}')
+
+    def shared_key(self, key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, version, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user, version
+
+    def _set_local(self, key, user, version, timeout):
+        with self._lock:
+            self._entries[key] = (user, version, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """Копия закэшированного пользователя или None."""
+        timeout = settings.TOKEN_CACHE_TIMEOUT
+        if not timeout:
+            return None
+        entry = self._get_local(key)
+        if entry is None and settings.TOKEN_CACHE_SHARED:
+            entry = cache.get(self.shared_key(key))
+            if entry is not None:
+                self._set_local(key, *entry, timeout)
+        if entry is None:
+            return None
+        user, version = entry
+        if version != self.user_version(user.pk).get_version():
+            return None
+        return copy.copy(user)
+
+    def set(self, key, user):
+        timeout = settings.TOKEN_CACHE_TIMEOUT
+        if not timeout:
+            return
+        version = self.user_version(user.pk).get_version()
+        self._set_local(key, user, version, timeout)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(self.shared_key(key), (user, version), timeout)
+
+    def invalidate_user(self, user_id):
+        self.user_version(user_id).bump()
+        with self._lock:
+            for key, (user, _, _) in list(self._entries.items()):
+                if user.pk == user_id:
+                    del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tags_cache = ReferenceDataCache('tags')
+ingredients_cache = ReferenceDataCache('ingredients')
+recipe_response_cache = ResponseCache('recipes')
+token_cache = TokenCache()
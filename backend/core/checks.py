@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_pin_cache(app_configs, **kwargs):
+    """
+        Закрепление за основной БД после записи хранится в django cache
+        и должно быть видно всем процессам.
+    """
+    if (
+        settings.READ_REPLICAS
+        and settings.REPLICA_STICKINESS_SECONDS
+        and not cache_is_shared()
+    ):
+        return [Error(
+            'READ_REPLICAS requires a cache shared between processes.',
+            hint=(
+                'Primary pins are stored in the default cache; set '
+                'CACHE_BACKEND to memcached or redis.'
+            ),
+            id='core.E001',
+        )]
+    return []
+
+
+@register(Tags.caches, Tags.security)
+def check_token_cache(app_configs, **kwargs):
+    """
+        Версии пользователей token_cache хранятся в django cache:
+        с кэшем процесса logout в одном процессе не сбрасывает
+        записи других до истечения TOKEN_CACHE_TIMEOUT.
+    """
+    if settings.TOKEN_CACHE_TIMEOUT and not cache_is_shared():
+        return [Warning(
+            'TOKEN_CACHE_TIMEOUT is enabled with a process-local cache.',
+            hint=(
+                'Revoked tokens stay valid in other processes for up to '
+                'TOKEN_CACHE_TIMEOUT seconds; use a shared CACHE_BACKEND '
+                'or set TOKEN_CACHE_TIMEOUT=0.'
+            ),
+            id='core.W002',
+        )]
+    return []
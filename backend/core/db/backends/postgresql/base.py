@@ -0,0 +1,82 @@
+from functools import partial
+
+from django.db.backends.postgresql import base
+
+from core.db.pool import ConnectionPool, get_pool
+
+
+def ping(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+        PostgreSQL с проверкой постоянных соединений и необязательным пулом.
+        HEALTH_CHECKS: соединение, оставшееся с прошлого HTTP запроса
+        (CONN_MAX_AGE), проверяется SELECT 1 перед первым использованием.
+        POOL['MAX_SIZE']: соединения берутся из общего для потоков пула
+        ограниченного размера и возвращаются в него вместо закрытия.
+    """
+
+    health_check_done = False
+
+    @property
+    def health_checks(self):
+        return self.settings_dict.get('HEALTH_CHECKS', False)
+
+    @property
+    def pool_settings(self):
+        return self.settings_dict.get('POOL') or {}
+
+    def get_pool(self, conn_params):
+        return get_pool(self.alias, lambda: ConnectionPool(
+            connect=partial(
+                super(DatabaseWrapper, self).get_new_connection, conn_params
+            ),
+            max_size=self.pool_settings['MAX_SIZE'],
+            timeout=self.pool_settings.get('TIMEOUT', 5),
+            is_usable=ping if self.health_checks else None,
+        ))
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_settings.get('MAX_SIZE'):
+            return super().get_new_connection(conn_params)
+        connection = self.get_pool(conn_params).acquire()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if not self.pool_settings.get('MAX_SIZE'):
+            return super()._close()
+        with self.wrap_database_errors:
+            get_pool(self.alias, None).release(
+                self.connection,
+                discard=self.in_atomic_block or self.errors_occurred,
+            )
+
+    def connect(self):
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and self.health_checks
+            and not self.health_check_done
+            and not self.in_atomic_block
+        ):
+            self.health_check_done = True
+            if not self.is_usable():
+                self.close()
+        super().ensure_connection()
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import deque
+
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    """
+        Ограниченный пул соединений с БД, общий для потоков процесса.
+        connect - функция, открывающая новое соединение.
+        is_usable - проверка соединения перед выдачей из пула.
+        Если все max_size соединений заняты, acquire ждёт не дольше
+        timeout секунд и бросает PoolTimeout.
+    """
+
+    def __init__(self, connect, max_size, timeout, is_usable=None):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.is_usable = is_usable
+        self._idle = deque()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.opened = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def acquire(self):
+        started = time.perf_counter()
+        acquired = self._slots.acquire(timeout=self.timeout)
+        with self._lock:
+            self.wait_seconds += time.perf_counter() - started
+            if not acquired:
+                self.timeouts += 1
+        if not acquired:
+            raise PoolTimeout(
+                f'No free database connection in {self.timeout} s '
+                f'(pool size {self.max_size}).'
+            )
+        try:
+            connection = self._take_idle()
+            if connection is None:
+                connection = self.connect()
+                with self._lock:
+                    self.opened += 1
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+        return connection
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection = self._idle.pop()
+            if not connection.closed and (
+                self.is_usable is None or self.is_usable(connection)
+            ):
+                return connection
+            self._discard(connection)
+
+    def release(self, connection, discard=False):
+        """
+            Возвращает соединение в пул. Незавершённая транзакция
+            откатывается, сломанные соединения закрываются.
+        """
+        try:
+            if not discard and not connection.closed:
+                try:
+                    connection.rollback()
+                except Exception:
+                    discard = True
+            if discard or connection.closed:
+                self._discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'opened': self.opened,
+                'acquired': self.acquired,
+                'timeouts': self.timeouts,
+                'wait_seconds': self.wait_seconds,
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, factory):
+    """Пул для базы alias, создаётся factory при первом обращении."""
+    with _pools_lock:
+        pool = _pools.get(alias)
+        if pool is None:
+            pool = _pools[alias] = factory()
+        return pool
+
+
+def pool_stats():
+    with _pools_lock:
+        pools = sorted(_pools.items())
+    return [(alias, pool.stats()) for alias, pool in pools]
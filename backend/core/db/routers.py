@@ -0,0 +1,72 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+_read_alias = ContextVar('db_read_alias', default=None)
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """
+        После записи пользователь читает с основной БД
+        REPLICA_STICKINESS_SECONDS секунд, пока реплики догоняют.
+    """
+    timeout = settings.REPLICA_STICKINESS_SECONDS
+    if settings.READ_REPLICAS and timeout and user.is_authenticated:
+        cache.set(pin_key(user.pk), True, timeout)
+
+
+def is_pinned(user):
+    return user.is_authenticated and cache.get(pin_key(user.pk), False)
+
+
+def choose_replica(user):
+    """
+        Случайная реплика или None, если реплик нет или пользователь
+        закреплён за основной БД.
+    """
+    if settings.READ_REPLICAS and not is_pinned(user):
+        return random.choice(settings.READ_REPLICAS)
+    return None
+
+
+def use_database(alias):
+    """
+        Направляет чтение в текущем контексте на alias
+        (None - основная БД). Возвращает токен для reset_replica.
+    """
+    return _read_alias.set(alias)
+
+
+def use_replica(user):
+    """Направляет чтение в текущем контексте на choose_replica(user)."""
+    return use_database(choose_replica(user))
+
+
+def use_primary():
+    """Направляет чтение в текущем контексте на основную БД."""
+    return use_database(None)
+
+
+def reset_replica(token):
+    _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """
+        Чтение внутри use_replica идёт на реплику, всё остальное,
+        включая чтение в транзакциях основной БД, - на default.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
@@ -0,0 +1,164 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from backend.settings import BASE_DIR
+from core.synthetic import SCALES, SyntheticDataGenerator
+from recipes.models import Ingredient
+
+
+DEFAULT_BASELINE = BASE_DIR / 'benchmarks' / 'baseline.json'
+PERCENTILES = (50, 90, 99)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = round(percent / 100 * (len(values) - 1))
+    return values[index]
+
+
+class Command(BaseCommand):
+    """
+    This command measures API latency and query counts on synthetic data.
+    Data is created inside a transaction and rolled back at the end.
+    Results are compared with a stored baseline: more queries or a p90
+    slower than baseline * (1 + tolerance) fail the command.
+    Example: python manage.py benchmark_api --scale small --iterations 50
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=list(SCALES), default='small'
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--tolerance', type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            generator = SyntheticDataGenerator(
+                seed=options['seed'], **SCALES[options['scale']]
+            )
+            started = time.perf_counter()
+            user_ids = generator.generate()
+            self.stdout.write(
+                f'Generated {generator.stats} '
+                f'in {time.perf_counter() - started:.1f} s'
+            )
+            client = self.get_client(user_ids[0])
+            results = {
+                name: self.measure(client, path, options['iterations'])
+                for name, path in self.get_scenarios()
+            }
+            transaction.set_rollback(True)
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name}: '
+                + ', '.join(
+                    f'p{percent} {result[f"p{percent}"]:.1f} ms'
+                    for percent in PERCENTILES
+                )
+                + f', queries {result["queries"]}'
+            )
+        key = f'{connection.vendor}:{options["scale"]}'
+        if options['update_baseline']:
+            self.save_baseline(options['baseline'], key, results)
+            self.stdout.write(f'Baseline {key} updated.')
+            return
+        self.compare(options['baseline'], key, results, options['tolerance'])
+
+    def get_client(self, user_id):
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        return Client(
+            SERVER_NAME='localhost',
+            HTTP_AUTHORIZATION=f'Token {token.key}',
+        )
+
+    def get_scenarios(self):
+        name = Ingredient.objects.order_by('id').values_list(
+            'name', flat=True
+        ).first() or ''
+        return (
+            ('recipes', '/api/recipes/'),
+            ('subscriptions', '/api/users/subscriptions/?recipes_limit=3'),
+            ('ingredients', f'/api/ingredients/?name={name[:3]}'),
+            ('shopping_cart', '/api/recipes/download_shopping_cart/'),
+        )
+
+    def request(self, client, path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: status {response.status_code}')
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        return response
+
+    def measure(self, client, path, iterations):
+        self.request(client, path)
+        timings = []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                self.request(client, path)
+                timings.append((time.perf_counter() - started) * 1000)
+        result = {
+            f'p{percent}': percentile(timings, percent)
+            for percent in PERCENTILES
+        }
+        result['queries'] = len(queries)
+        return result
+
+    def load_baseline(self, path):
+        try:
+            with open(path, encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def save_baseline(self, path, key, results):
+        baseline = self.load_baseline(path)
+        baseline[key] = {
+            name: {
+                'p90': round(result['p90'], 2),
+                'queries': result['queries'],
+            }
+            for name, result in results.items()
+        }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(baseline, file, indent=4, sort_keys=True)
+            file.write('\n')
+
+    def compare(self, path, key, results, tolerance):
+        baseline = self.load_baseline(path).get(key)
+        if baseline is None:
+            self.stdout.write(
+                f'No baseline for {key}, run with --update-baseline.'
+            )
+            return
+        errors = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            if result['queries'] > expected['queries']:
+                errors.append(
+                    f'{name}: {result["queries"]} queries, '
+                    f'baseline {expected["queries"]}'
+                )
+            limit = expected['p90'] * (1 + tolerance)
+            if result['p90'] > limit:
+                errors.append(
+                    f'{name}: p90 {result["p90"]:.1f} ms, '
+                    f'baseline {expected["p90"]:.1f} ms'
+                )
+        if errors:
+            raise CommandError(
+                'Benchmark regression:\n' + '\n'.join(errors)
+            )
+        self.stdout.write(f'No regressions against baseline {key}.')
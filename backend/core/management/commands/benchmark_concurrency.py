@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from django.core.management.base import BaseCommand, CommandError
+from .benchmark_api import percentile
+
+
+DEFAULT_PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=а')
+
+
+class Command(BaseCommand):
+    """
+    This command compares throughput of running servers under concurrency,
+    e.g. gunicorn (WSGI) against uvicorn (ASGI, ASYNC_READ_VIEWS=True):
+    every path is requested --requests times by --concurrency threads.
+    Example: python manage.py benchmark_concurrency
+        --server wsgi=http://localhost:9000
+        --server asgi=http://localhost:9001 --concurrency 32
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server', action='append', required=True,
+            help='name=base_url, may be given several times.'
+        )
+        parser.add_argument('--path', action='append', dest='paths')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--token')
+
+    def handle(self, *args, **options):
+        headers = {}
+        if options['token']:
+            headers['Authorization'] = f'Token {options["token"]}'
+        for server in options['server']:
+            name, _, base_url = server.partition('=')
+            if not base_url:
+                raise CommandError(f'Expected name=base_url, got {server}')
+            for path in options['paths'] or DEFAULT_PATHS:
+                result = self.measure(
+                    base_url.rstrip('/') + quote(path, safe='/?=&'),
+                    headers,
+                    options['concurrency'],
+                    options['requests'],
+                )
+                self.stdout.write(
+                    f'{name} {path}: {result["rps"]:.0f} req/s, '
+                    f'p50 {result["p50"]:.1f} ms, '
+                    f'p99 {result["p99"]:.1f} ms, '
+                    f'errors {result["errors"]}'
+                )
+
+    def request(self, url, headers):
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(url, headers=headers)) as response:
+                response.read()
+                ok = response.status == 200
+        except HTTPError:
+            ok = False
+        return ok, (time.perf_counter() - started) * 1000
+
+    def measure(self, url, headers, concurrency, requests):
+        self.request(url, headers)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(
+                lambda _: self.request(url, headers), range(requests)
+            ))
+            seconds = time.perf_counter() - started
+        timings = [timing for _, timing in results]
+        return {
+            'rps': requests / seconds,
+            'p50': percentile(timings, 50),
+            'p99': percentile(timings, 99),
+            'errors': sum(not ok for ok, _ in results),
+        }
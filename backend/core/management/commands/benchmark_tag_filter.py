@@ -0,0 +1,97 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.cache import tags_cache
+from recipes.models import Recipe, Tag, User
+from recipes.tag_index import RecipeTag, filter_by_tags
+
+
+class Command(BaseCommand):
+    """
+    This command compares tag filtering strategies on synthetic data.
+    Data is created inside a transaction and rolled back at the end.
+    Example: python manage.py benchmark_tag_filter --recipes 100000
+    """
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            slugs = self.create_data(rng, options)
+            self.stdout.write(
+                f'Recipes: {Recipe.objects.count()}, '
+                f'tag links: {RecipeTag.objects.count()}'
+            )
+            for selected in (slugs[:1], slugs[:3], slugs):
+                self.compare(selected, options['repeat'])
+            transaction.set_rollback(True)
+        tags_cache.bump()
+
+    def create_data(self, rng, options):
+        author = User.objects.create(
+            email='benchmark@foodgram.local',
+            username='benchmark',
+            first_name='benchmark',
+            last_name='benchmark',
+        )
+        Tag.objects.bulk_create(
+            Tag(name=f'bench-{number}', color='#000000',
+                slug=f'bench-{number}')
+            for number in range(options['tags'])
+        )
+        tags_cache.bump()
+        tags = list(Tag.objects.filter(slug__startswith='bench-'))
+        batch_size = options['batch_size']
+        for start in range(0, options['recipes'], batch_size):
+            count = min(batch_size, options['recipes'] - start)
+            Recipe.objects.bulk_create(
+                Recipe(
+                    name=f'Рецепт {start + number}',
+                    author=author,
+                    text='Описание',
+                    cooking_time=10,
+                )
+                for number in range(count)
+            )
+        links = []
+        for recipe_id in Recipe.objects.filter(
+            author=author
+        ).values_list('id', flat=True).iterator():
+            for tag in rng.sample(tags, rng.randint(1, 3)):
+                links.append(RecipeTag(recipe_id=recipe_id, tag_id=tag.id))
+            if len(links) >= batch_size:
+                RecipeTag.objects.bulk_create(links)
+                links = []
+        RecipeTag.objects.bulk_create(links)
+        return [tag.slug for tag in tags]
+
+    def measure(self, build, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = build()
+            queryset.count()
+            list(queryset.order_by('-pub_date', '-id')[:6])
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        return timings[len(timings) // 2] * 1000
+
+    def compare(self, slugs, repeat):
+        join = self.measure(
+            lambda: Recipe.objects.filter(tags__slug__in=slugs).distinct(),
+            repeat
+        )
+        exists = self.measure(
+            lambda: filter_by_tags(Recipe.objects.all(), slugs), repeat
+        )
+        self.stdout.write(
+            f'tags={len(slugs)}: join+distinct {join:.1f} ms, '
+            f'exists {exists:.1f} ms (median of {repeat})'
+        )
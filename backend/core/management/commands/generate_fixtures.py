@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from core.synthetic import SCALES, ZipfSyntheticDataGenerator
+
+
+COUNT_OPTIONS = (
+    'users',
+    'recipes',
+    'ingredients_per_recipe',
+    'follows',
+    'favorites',
+    'carts',
+)
+
+
+class Command(BaseCommand):
+    """
+    This command fills the database with synthetic users, recipes,
+    ingredient amounts, follows, favorites and carts.
+    Popularity of authors, recipes and ingredients follows Zipf's law.
+    Counts come from --scale and can be overridden one by one;
+    follows, favorites and carts are given per user.
+    Example: python manage.py generate_fixtures --scale large --seed 1
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=list(SCALES), default='large'
+        )
+        for option in COUNT_OPTIONS:
+            parser.add_argument(
+                f'--{option.replace("_", "-")}', type=int, dest=option
+            )
+        parser.add_argument('--exponent', type=float, default=1.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--prefix', default='synthetic')
+        parser.add_argument('--no-copy', action='store_true')
+
+    def handle(self, *args, **options):
+        counts = dict(SCALES[options['scale']])
+        for option in COUNT_OPTIONS:
+            if options[option] is not None:
+                counts[option] = options[option]
+        generator = ZipfSyntheticDataGenerator(
+            exponent=options['exponent'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            prefix=options['prefix'],
+            use_copy=not options['no_copy'],
+            **counts,
+        )
+        started = time.monotonic()
+        with transaction.atomic():
+            generator.generate()
+        seconds = time.monotonic() - started
+        rows = sum(generator.stats.values())
+        for name, count in generator.stats.items():
+            self.stdout.write(f'{name}: {count}')
+        self.stdout.write(
+            f'Total: {rows} rows in {seconds:.1f} s, '
+            f'{rows / seconds:.0f} rows/sec'
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    """
+    This command rebuilds materialized follow feeds of users who follow
+    at least FEED_TIMELINE_THRESHOLD authors.
+    Use it after changing the threshold or loading follows bypassing the API.
+    """
+    def handle(self, *args, **options):
+        self.stdout.write('Start rebuilding feeds')
+        with transaction.atomic():
+            created = FeedEntry.objects.rebuild()
+        self.stdout.write(f'Rebuild success, entries: {created}')
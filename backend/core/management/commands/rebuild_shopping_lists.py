@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    """
+    This command rebuilds materialized shopping lists from user carts.
+    Use it after carts or recipe ingredients were changed bypassing the API.
+    """
+    def handle(self, *args, **options):
+        self.stdout.write('Start rebuilding shopping lists')
+        with transaction.atomic():
+            created = ShoppingListItem.objects.rebuild()
+        self.stdout.write(f'Rebuild success, items: {created}')
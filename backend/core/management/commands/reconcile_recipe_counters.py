@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    This command recalculates denormalized recipe counters.
+    Example: favorites_count, carts_count
+    """
+    def handle(self, *args, **options):
+        self.stdout.write('Start reconciling recipe counters')
+        fixed = Recipe.objects.reconcile_counters()
+        self.stdout.write(f'Reconcile success, fixed recipes: {fixed}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from recipes.images import has_variants, process_recipe_image
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """
+    This command builds WebP variants of recipe images
+    that have no variants or whose variant files are missing.
+    Use it after a worker restart dropped queued image jobs
+    (IMAGE_PROCESSING_ASYNC=True) or after IMAGE_VARIANTS changed.
+    Example: python manage.py regenerate_image_variants --all
+    """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rebuild variants of every recipe image',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Start regenerating image variants')
+        regenerated = 0
+        for recipe in Recipe.objects.exclude(image='').only(
+            'image', 'image_variants'
+        ).iterator():
+            if options['all'] or not has_variants(
+                recipe.image, recipe.image_variants
+            ):
+                process_recipe_image(recipe.pk)
+                regenerated += 1
+        self.stdout.write(f'Regenerate success, recipes: {regenerated}')
@@ -1,14 +1,38 @@
 from django.core.management.base import BaseCommand
-from core.utils import load_table_from_json
+from core.cache import ingredients_cache, recipe_response_cache
+from core.utils import DEFAULT_BATCH_SIZE, load_table
 from recipes.models import Ingredient
 
 
 class Command(BaseCommand):
     """
     This command import static data.
-    Example: Ingredient, ... from JSON file
+    Example: Ingredient, ... from JSON or CSV file
     """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=('json', 'csv'),
+            default='json',
+            help='Source file format in static/data/',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows per bulk INSERT/UPDATE',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Start loading static data from json files')
-        load_table_from_json(Ingredient, 'ingredients')
-        self.stdout.write('Load static data success')
+        stats = load_table(
+            Ingredient,
+            'ingredients',
+            natural_key=('name', 'measurement_unit'),
+            file_format=options['format'],
+            fieldnames=('name', 'measurement_unit'),
+            batch_size=options['batch_size'],
+        )
+        ingredients_cache.bump()
+        recipe_response_cache.bump()
+        self.stdout.write(f'Load static data success ({stats})')
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
-from core.utils import load_table_from_json
+from core.cache import recipe_response_cache, tags_cache
+from core.utils import DEFAULT_BATCH_SIZE, load_table
 from recipes.models import Tag
 
 
@@ -8,7 +9,22 @@ class Command(BaseCommand):
     This command import static data.
     Example: Tags, ... from JSON file
     """
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows per bulk INSERT/UPDATE',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write('Start loading static data from json files')
-        load_table_from_json(Tag, 'tags')
-        self.stdout.write('Load static data success')
+        stats = load_table(
+            Tag,
+            'tags',
+            natural_key=('slug', ),
+            batch_size=options['batch_size'],
+        )
+        tags_cache.bump()
+        recipe_response_cache.bump()
+        self.stdout.write(f'Load static data success ({stats})')
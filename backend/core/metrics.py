@@ -0,0 +1,202 @@
+import bisect
+import threading
+from collections import defaultdict
+
+from .db.pool import pool_stats
+
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def escape_label(value):
+    return (
+        str(value).replace('\\', '\\\\').replace('"', '\\"')
+        .replace('\n', '\\n')
+    )
+
+
+class Histogram:
+    """
+        Гистограмма в формате Prometheus с произвольными метками.
+        Данные хранятся в памяти процесса.
+    """
+
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = defaultdict(
+            lambda: [[0] * len(self.buckets), 0, 0.0]
+        )
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, _, _ = entry = self._values[key]
+            if position < len(counts):
+                counts[position] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def format_labels(self, key, **extra):
+        pairs = list(zip(self.label_names, key)) + list(extra.items())
+        return ','.join(
+            f'{name}="{escape_label(value)}"' for name, value in pairs
+        )
+
+    def collect(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} histogram',
+        ]
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), count, total))
+                for key, (counts, count, total) in self._values.items()
+            )
+        for key, (counts, count, total) in values:
+            cumulative = 0
+            for bucket, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self.format_labels(key, le=bucket)
+                lines.append(f'{self.name}_bucket{{{labels}}} {cumulative}')
+            labels = self.format_labels(key, le='+Inf')
+            lines.append(f'{self.name}_bucket{{{labels}}} {count}')
+            labels = self.format_labels(key)
+            lines.append(f'{self.name}_sum{{{labels}}} {total}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class CallbackMetric:
+    """
+        Метрика, значения которой вычисляются при сборе.
+        callback возвращает пары (значения меток, значение).
+    """
+
+    def __init__(self, name, documentation, metric_type, label_names,
+                 callback):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.label_names = tuple(label_names)
+        self.callback = callback
+
+    def clear(self):
+        pass
+
+    def collect(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.metric_type}',
+        ]
+        for key, value in sorted(self.callback()):
+            labels = ','.join(
+                f'{name}="{escape_label(label)}"'
+                for name, label in zip(self.label_names, key)
+            )
+            lines.append(f'{self.name}{{{labels}}} {value}')
+        return lines
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+REQUEST_LABELS = ('view', 'method')
+
+request_duration = registry.register(Histogram(
+    'foodgram_request_duration_seconds',
+    'Total request latency.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+))
+db_duration = registry.register(Histogram(
+    'foodgram_db_duration_seconds',
+    'Time spent in SQL queries per request.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+))
+db_queries = registry.register(Histogram(
+    'foodgram_db_queries',
+    'Number of SQL queries per request.',
+    QUERY_COUNT_BUCKETS,
+    REQUEST_LABELS,
+))
+serialization_duration = registry.register(Histogram(
+    'foodgram_serialization_duration_seconds',
+    'Time spent building serializer data, including lazy SQL queries.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+))
+render_duration = registry.register(Histogram(
+    'foodgram_render_duration_seconds',
+    'Time spent encoding the response body or producing streamed chunks.',
+    LATENCY_BUCKETS,
+    REQUEST_LABELS,
+))
+
+
+def pool_samples(*fields):
+    def collect():
+        return [
+            ((alias, field), stats[field])
+            for alias, stats in pool_stats()
+            for field in fields
+        ]
+    return collect
+
+
+POOL_LABELS = ('alias', 'state')
+
+db_pool_connections = registry.register(CallbackMetric(
+    'foodgram_db_pool_connections',
+    'Database pool size and connections in use or idle.',
+    'gauge',
+    POOL_LABELS,
+    pool_samples('max_size', 'in_use', 'idle'),
+))
+db_pool_events = registry.register(CallbackMetric(
+    'foodgram_db_pool_events_total',
+    'Connections opened and acquired from the pool, acquire timeouts.',
+    'counter',
+    ('alias', 'event'),
+    pool_samples('opened', 'acquired', 'timeouts'),
+))
+db_pool_wait = registry.register(CallbackMetric(
+    'foodgram_db_pool_wait_seconds_total',
+    'Time spent waiting for a free pool connection.',
+    'counter',
+    ('alias', ),
+    lambda: [
+        ((alias, ), stats['wait_seconds']) for alias, stats in pool_stats()
+    ],
+))
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from . import metrics
+
+
+logger = logging.getLogger('foodgram.slow_requests')
+current_recorder = ContextVar('current_recorder', default=None)
+
+
+class QueryRecorder:
+    """execute_wrapper, который запоминает SQL запросы и их длительность."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((time.perf_counter() - started, sql))
+
+    @property
+    def duration(self):
+        return sum(duration for duration, _ in self.queries)
+
+
+@contextmanager
+def measure_serialization(request):
+    """
+        Добавляет время блока к времени сериализации запроса.
+        Вложенные вызовы (сериализатор внутри сериализатора)
+        не учитываются повторно.
+    """
+    request = getattr(request, '_request', request)
+    if request is None or getattr(request, 'metrics_serializing', True):
+        yield
+        return
+    request.metrics_serializing = True
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request.metrics_serializing = False
+        request.metrics_serialize += time.perf_counter() - started
+
+
+def record_query(execute, sql, params, many, context):
+    """
+        execute_wrapper всех соединений: передаёт запрос в QueryRecorder
+        текущего запроса. Контекст копируется в потоки sync_to_async,
+        поэтому запросы из пула потоков ASGI тоже учитываются.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@contextmanager
+def recording_queries(recorder):
+    token = current_recorder.set(recorder)
+    try:
+        yield
+    finally:
+        current_recorder.reset(token)
+
+
+class MetricsMiddleware:
+    """
+        Собирает по каждому view action количество SQL запросов,
+        время в БД, время сериализации и рендеринга ответа
+        и общую задержку.
+        Для потоковых ответов метрики записываются после отдачи тела,
+        запросы при его формировании тоже учитываются.
+        Под ASGI работает асинхронно и не занимает поток на весь запрос.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        recorder = self.start(request)
+        started = time.perf_counter()
+        with recording_queries(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        recorder = self.start(request)
+        started = time.perf_counter()
+        with recording_queries(recorder):
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, started)
+
+    def start(self, request):
+        request.metrics_serialize = 0.0
+        request.metrics_serializing = False
+        request.metrics_render = 0.0
+        return QueryRecorder()
+
+    def finish(self, request, response, recorder, started):
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content,
+                recorder, started
+            )
+            return response
+        total = time.perf_counter() - started
+        self.record(request, response, recorder, total)
+        return response
+
+    def stream(self, request, response, content, recorder, started):
+        try:
+            while True:
+                chunk_started = time.perf_counter()
+                with recording_queries(recorder):
+                    chunk = next(content, None)
+                request.metrics_render += time.perf_counter() - chunk_started
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            total = time.perf_counter() - started
+            self.record(request, response, recorder, total)
+
+    def process_template_response(self, request, response):
+        render = response.render
+
+        def timed_render():
+            started = time.perf_counter()
+            try:
+                return render()
+            finally:
+                request.metrics_render += time.perf_counter() - started
+
+        response.render = timed_render
+        return response
+
+    def view_name(self, request):
+        """
+            Имя view action по resolver_match. Не process_view: в ASGI
+            синхронный хук выполнялся бы в общем потоке sync_to_async.
+        """
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return 'unresolved'
+        view_class = getattr(match.func, 'cls', None)
+        if view_class is None:
+            return getattr(match.func, '__name__', 'unknown')
+        actions = getattr(match.func, 'actions', None) or {}
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view_class.__name__}.{action}'
+
+    def record(self, request, response, recorder, total):
+        view = self.view_name(request)
+        labels = {'view': view, 'method': request.method}
+        metrics.request_duration.observe(total, **labels)
+        metrics.db_duration.observe(recorder.duration, **labels)
+        metrics.db_queries.observe(len(recorder.queries), **labels)
+        metrics.serialization_duration.observe(
+            request.metrics_serialize, **labels
+        )
+        metrics.render_duration.observe(request.metrics_render, **labels)
+        if settings.METRICS_DEBUG_HEADERS and not response.streaming:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.duration * 1000:.1f};'
+                f'desc="{len(recorder.queries)} queries", '
+                f'serialize;dur={request.metrics_serialize * 1000:.1f}, '
+                f'render;dur={request.metrics_render * 1000:.1f}, '
+                f'total;dur={total * 1000:.1f}'
+            )
+            response['X-DB-Queries'] = len(recorder.queries)
+        if total >= settings.SLOW_REQUEST_THRESHOLD:
+            worst = sorted(recorder.queries, reverse=True)[:5]
+            logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries, db %.3fs\n%s',
+                request.method,
+                request.get_full_path(),
+                view,
+                total,
+                len(recorder.queries),
+                recorder.duration,
+                '\n'.join(
+                    f'  {duration:.3f}s {sql}' for duration, sql in worst
+                ),
+            )
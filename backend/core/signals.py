@@ -0,0 +1,33 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import User
+from .cache import token_cache
+from .middleware import record_query
+
+
+@receiver(post_delete, sender=Token)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_token_cache(instance, sender, **kwargs):
+    """
+        Сбрасывает кэш токенов пользователя сразу и после коммита:
+        параллельный запрос мог закэшировать старые данные до коммита.
+        Обновление через QuerySet.update() сигналов не вызывает.
+    """
+    user_id = instance.user_id if sender is Token else instance.pk
+
+    def invalidate():
+        token_cache.invalidate_user(user_id)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(connection_created)
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
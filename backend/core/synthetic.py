@@ -0,0 +1,476 @@
+import csv
+import io
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate, chain
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from core.cache import ingredients_cache, tags_cache
+from core.utils import load_table
+from recipes.models import (
+    BasketRecipe,
+    FavoriteRecipe,
+    FeedEntry,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingListItem,
+    Tag,
+    User,
+)
+from recipes.search import fill_search_vectors
+from users.models import FollowingAuthor
+
+
+PUB_DATE_SPREAD = 365 * 24 * 60 * 60
+# Во сколько раз число попыток выборки может превысить размер выборки,
+# прежде чем остаток доберётся равномерно.
+SAMPLE_ATTEMPTS = 4
+LINK_MODELS = (
+    IngredientAmount,
+    Recipe.tags.through,
+    FollowingAuthor,
+    FavoriteRecipe,
+    BasketRecipe,
+)
+DERIVED_MODELS = (Recipe, ShoppingListItem, FeedEntry)
+SCALES = {
+    'tiny': {
+        'users': 5,
+        'recipes': 20,
+        'ingredients_per_recipe': 3,
+        'follows': 3,
+        'favorites': 5,
+        'carts': 3,
+    },
+    'small': {
+        'users': 50,
+        'recipes': 500,
+        'ingredients_per_recipe': 8,
+        'follows': 20,
+        'favorites': 30,
+        'carts': 10,
+    },
+    'medium': {
+        'users': 500,
+        'recipes': 10000,
+        'ingredients_per_recipe': 10,
+        'follows': 50,
+        'favorites': 100,
+        'carts': 20,
+    },
+    'large': {
+        'users': 5000,
+        'recipes': 100000,
+        'ingredients_per_recipe': 12,
+        'follows': 200,
+        'favorites': 300,
+        'carts': 30,
+    },
+}
+
+
+class SyntheticDataGenerator:
+    """
+        Генератор синтетических данных для нагрузочных тестов.
+        Количество follows / favorites / carts задаётся на пользователя.
+    """
+
+    def __init__(
+        self,
+        users,
+        recipes,
+        ingredients_per_recipe,
+        follows,
+        favorites,
+        carts,
+        seed=0,
+        batch_size=5000,
+        prefix='synthetic',
+        use_copy=True,
+    ):
+        self.users = users
+        self.recipes = recipes
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.follows = follows
+        self.favorites = favorites
+        self.carts = carts
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.use_copy = use_copy and connection.vendor == 'postgresql'
+        self.rng = random.Random(seed)
+        self.stats = {}
+
+    def randint(self, low, high):
+        """Аналог random.randint, в несколько раз быстрее."""
+        return low + int(self.rng.random() * (high - low + 1))
+
+    def sample(self, population, count, exclude=None, choices=None):
+        """
+            Выборка без повторов из population, отсортированная,
+            чтобы порядок строк не зависел от значений id.
+            choices(k) - функция выбора k элементов с повторами,
+            по умолчанию равномерная.
+            Когда count близок к размеру population, choices всё чаще
+            возвращает уже выбранные значения: после SAMPLE_ATTEMPTS * count
+            выбранных элементов остаток добирается равномерно без повторов.
+        """
+        excluded = exclude is not None and exclude in population
+        count = min(count, len(population) - excluded)
+        if choices is None and not excluded:
+            return sorted(self.rng.sample(population, count))
+        choices = choices or (lambda k: self.rng.choices(population, k=k))
+        result = set()
+        attempts = SAMPLE_ATTEMPTS * count
+        while len(result) < count and attempts > 0:
+            needed = count - len(result)
+            attempts -= needed
+            result.update(choices(needed))
+            result.discard(exclude)
+        if len(result) < count:
+            rest = [
+                value for value in population
+                if value not in result and value != exclude
+            ]
+            result.update(self.rng.sample(rest, count - len(result)))
+        return sorted(result)
+
+    def insert_batch(self, model, columns, batch):
+        if not batch:
+            return
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        names = ', '.join(quote(column) for column in columns)
+        with connection.cursor() as cursor:
+            if not self.use_copy:
+                placeholders = ', '.join(['%s'] * len(columns))
+                cursor.executemany(
+                    f'INSERT INTO {table} ({names}) VALUES ({placeholders})',
+                    batch,
+                )
+                return
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                row if None not in row
+                else [r'\N' if value is None else value for value in row]
+                for row in batch
+            )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {table} ({names}) '
+                f"FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+
+    def bulk_insert(self, model, fields, rows):
+        """
+            Вставляет строки пачками минуя создание экземпляров моделей.
+            rows - генератор кортежей значений полей fields,
+            уже приведённых к виду для БД.
+            На PostgreSQL пачки загружаются через COPY,
+            на остальных СУБД - через executemany.
+        """
+        columns = [model._meta.get_field(field).column for field in fields]
+        batch, total = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self.insert_batch(model, columns, batch)
+                total += len(batch)
+                batch = []
+        self.insert_batch(model, columns, batch)
+        total += len(batch)
+        self.stats[model.__name__] = total
+        return total
+
+    @contextmanager
+    def indexes_dropped(self, models):
+        """
+            На PostgreSQL снимает на время загрузки внешние ключи,
+            ограничения уникальности и вторичные индексы таблиц models
+            и создаёт их заново. Построить индекс по готовой таблице
+            быстрее, чем вставлять в него каждую строку, а одна проверка
+            внешнего ключа быстрее отложенного триггера на строку.
+            Первичные ключи остаются.
+        """
+        if connection.vendor != 'postgresql':
+            yield
+            return
+        tables = [[model._meta.db_table for model in models]]
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Внешние ключи снимаются раньше ограничений уникальности
+            # и создаются после них.
+            cursor.execute(
+                "SELECT conrelid::regclass::text, "
+                "quote_ident(conname), pg_get_constraintdef(oid) "
+                "FROM pg_constraint "
+                "WHERE contype IN ('f', 'u') "
+                "AND conrelid = ANY(%s::regclass[]) "
+                "ORDER BY contype",
+                tables,
+            )
+            constraints = cursor.fetchall()
+            cursor.execute(
+                "SELECT indexrelid::regclass::text, "
+                "pg_get_indexdef(indexrelid) "
+                "FROM pg_index "
+                "WHERE indrelid = ANY(%s::regclass[]) "
+                "AND NOT indisprimary AND NOT EXISTS ("
+                "SELECT FROM pg_constraint WHERE conindid = indexrelid)",
+                tables,
+            )
+            indexes = cursor.fetchall()
+            for table, name, _ in constraints:
+                cursor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {name}')
+            for name, _ in indexes:
+                cursor.execute(f'DROP INDEX {name}')
+            yield
+            for _, definition in indexes:
+                cursor.execute(definition)
+            for table, name, definition in reversed(constraints):
+                cursor.execute(
+                    f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'
+                )
+
+    def last_id(self, model):
+        return model.objects.aggregate(last=Max('id'))['last'] or 0
+
+    def new_ids(self, model, last_id):
+        return list(
+            model.objects.filter(
+                pk__gt=last_id
+            ).order_by('id').values_list('id', flat=True)
+        )
+
+    def ensure_reference_data(self):
+        if not Ingredient.objects.exists():
+            load_table(
+                Ingredient,
+                'ingredients',
+                natural_key=('name', 'measurement_unit'),
+            )
+            ingredients_cache.bump()
+        if not Tag.objects.exists():
+            load_table(Tag, 'tags', natural_key=('slug', ))
+            tags_cache.bump()
+
+    def create_users(self):
+        last_id = self.last_id(User)
+        password = make_password(None)
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        self.bulk_insert(
+            User,
+            (
+                'email', 'username', 'first_name', 'last_name', 'password',
+                'is_superuser', 'is_staff', 'is_active', 'date_joined',
+            ),
+            (
+                (
+                    f'{self.prefix}{number}@foodgram.local',
+                    f'{self.prefix}{number}',
+                    self.prefix,
+                    self.prefix,
+                    password,
+                    False,
+                    False,
+                    True,
+                    now,
+                )
+                for number in range(self.users)
+            ),
+        )
+        return self.new_ids(User, last_id)
+
+    def pick_author(self, user_ids):
+        return self.rng.choice(user_ids)
+
+    def pick_recipes(self, recipes, count):
+        return self.sample(recipes, count)
+
+    def pick_authors(self, user_ids, count, user_id):
+        return self.sample(user_ids, count, exclude=user_id)
+
+    def pick_ingredients(self, ingredient_ids, count):
+        return self.sample(ingredient_ids, count)
+
+    def pub_date(self, now):
+        """Дата публикации в пределах PUB_DATE_SPREAD до now."""
+        return connection.ops.adapt_datetimefield_value(
+            now - timedelta(seconds=self.randint(0, PUB_DATE_SPREAD))
+        )
+
+    def pick_interactions(self, user_ids):
+        """
+            Заранее выбирает избранное и корзины пользователей
+            по номерам рецептов, чтобы счётчики рецептов были известны
+            до их вставки и не пересчитывались запросом.
+        """
+        recipes = range(self.recipes)
+        return {
+            model: [self.pick_recipes(recipes, count) for _ in user_ids]
+            for model, count in (
+                (FavoriteRecipe, self.favorites),
+                (BasketRecipe, self.carts),
+            )
+        }
+
+    def create_recipes(self, user_ids, interactions):
+        last_id = self.last_id(Recipe)
+        now = timezone.now()
+        favorites, carts = (
+            Counter(chain.from_iterable(interactions[model]))
+            for model in (FavoriteRecipe, BasketRecipe)
+        )
+        self.bulk_insert(
+            Recipe,
+            (
+                'name', 'author', 'text', 'cooking_time', 'pub_date',
+                'favorites_count', 'carts_count', 'image_variants',
+            ),
+            (
+                (
+                    f'Рецепт {number}',
+                    self.pick_author(user_ids),
+                    f'Описание рецепта {number}',
+                    self.randint(1, 180),
+                    self.pub_date(now),
+                    favorites[number],
+                    carts[number],
+                    '{}',
+                )
+                for number in range(self.recipes)
+            ),
+        )
+        return self.new_ids(Recipe, last_id)
+
+    def create_recipe_links(self, recipe_ids):
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        self.bulk_insert(
+            IngredientAmount,
+            ('recipe', 'ingredient', 'amount'),
+            (
+                (recipe_id, ingredient_id, self.randint(1, 500))
+                for recipe_id in recipe_ids
+                for ingredient_id in self.pick_ingredients(
+                    ingredient_ids, self.ingredients_per_recipe
+                )
+            ),
+        )
+        self.bulk_insert(
+            Recipe.tags.through,
+            ('recipe', 'tag'),
+            (
+                (recipe_id, tag_id)
+                for recipe_id in recipe_ids
+                for tag_id in self.sample(tag_ids, self.randint(1, 3))
+            ),
+        )
+
+    def create_interactions(self, user_ids, recipe_ids, interactions):
+        self.bulk_insert(
+            FollowingAuthor,
+            ('user', 'author'),
+            (
+                (user_id, author_id)
+                for user_id in user_ids
+                for author_id in self.pick_authors(
+                    user_ids, self.follows, user_id
+                )
+            ),
+        )
+        for model, picks in interactions.items():
+            self.bulk_insert(
+                model,
+                ('user', 'recipe'),
+                (
+                    (user_id, recipe_ids[number])
+                    for user_id, numbers in zip(user_ids, picks)
+                    for number in numbers
+                ),
+            )
+
+    def generate(self):
+        """Создаёт данные и возвращает id созданных пользователей."""
+        self.ensure_reference_data()
+        users_last_id = self.last_id(User)
+        recipes_last_id = self.last_id(Recipe)
+        with self.indexes_dropped(DERIVED_MODELS):
+            with self.indexes_dropped(LINK_MODELS):
+                user_ids = self.create_users()
+                interactions = self.pick_interactions(user_ids)
+                recipe_ids = self.create_recipes(user_ids, interactions)
+                self.create_recipe_links(recipe_ids)
+                self.create_interactions(user_ids, recipe_ids, interactions)
+            # Векторам нужен индекс ингредиентов рецепта, поэтому
+            # производные данные считаются после его создания.
+            fill_search_vectors(Recipe.objects.filter(pk__gt=recipes_last_id))
+            new_users = User.objects.filter(
+                pk__gt=users_last_id
+            ).values('pk')
+            self.stats[ShoppingListItem.__name__] = (
+                ShoppingListItem.objects.rebuild(new_users)
+            )
+            self.stats[FeedEntry.__name__] = (
+                FeedEntry.objects.rebuild(new_users)
+            )
+        return user_ids
+
+
+class ZipfSyntheticDataGenerator(SyntheticDataGenerator):
+    """
+        Генератор с Zipf-распределением популярности:
+        k-й по популярности автор, рецепт или ингредиент выбирается
+        с вероятностью, пропорциональной 1 / k ** exponent.
+        Порядок популярности случайный и не связан с id.
+    """
+
+    def __init__(self, *args, exponent=1.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.exponent = exponent
+        self.distributions = {}
+
+    def zipf_choices(self, name, population, k=1):
+        """Выбирает k элементов population с повторами."""
+        if name not in self.distributions:
+            values = list(population)
+            self.rng.shuffle(values)
+            weights = list(accumulate(
+                1 / rank ** self.exponent
+                for rank in range(1, len(values) + 1)
+            ))
+            self.distributions[name] = (values, weights)
+        values, weights = self.distributions[name]
+        return self.rng.choices(values, cum_weights=weights, k=k)
+
+    def pick_author(self, user_ids):
+        return self.zipf_choices('authors', user_ids)[0]
+
+    def pick_recipes(self, recipes, count):
+        return self.sample(
+            recipes,
+            count,
+            choices=lambda k: self.zipf_choices('recipes', recipes, k),
+        )
+
+    def pick_authors(self, user_ids, count, user_id):
+        return self.sample(
+            user_ids,
+            count,
+            exclude=user_id,
+            choices=lambda k: self.zipf_choices('authors', user_ids, k),
+        )
+
+    def pick_ingredients(self, ingredient_ids, count):
+        return self.sample(
+            ingredient_ids,
+            count,
+            choices=lambda k: self.zipf_choices(
+                'ingredients', ingredient_ids, k
+            ),
+        )
@@ -1,15 +1,146 @@
-from backend.settings import BASE_DIR
+import csv
 import json
+import time
+from itertools import chain
+
+from django.db import transaction
+
+from backend.settings import BASE_DIR
+
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+class LoadStats:
+    """Итоги загрузки справочной таблицы."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self.seconds = 0
+
+    @property
+    def rows(self):
+        return self.created + self.updated + self.skipped
+
+    @property
+    def rows_per_second(self):
+        if not self.seconds:
+            return float(self.rows)
+        return self.rows / self.seconds
+
+    def finish(self):
+        self.seconds = time.monotonic() - self.started
+
+    def __str__(self):
+        return (
+            f'created: {self.created}, updated: {self.updated}, '
+            f'skipped: {self.skipped}, {self.rows_per_second:.0f} rows/sec'
+        )
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Читает JSON массив объектов потоком, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise ValueError('JSON file must contain an array.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                obj, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                if not chunk:
+                    raise
+                break
+            yield obj
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def iter_csv_rows(file, fieldnames):
+    """Читает CSV файл без заголовка построчно."""
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fieldnames, row))
+
 
+def load_table(
+    model,
+    file_name,
+    natural_key,
+    file_format='json',
+    fieldnames=None,
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    """
+        Загружает справочную таблицу из static/data/<file_name>.<format>.
+        Строки сопоставляются с существующими по natural_key:
+        новые вставляются через bulk_create, изменённые - bulk_update.
+        Таблица не очищается, поэтому внешние ключи не нарушаются.
+    """
+    stats = LoadStats()
+    path = BASE_DIR / f'static/data/{file_name}.{file_format}'
+    with open(path, 'r', encoding='utf-8') as file, transaction.atomic():
+        if file_format == 'csv':
+            rows = iter_csv_rows(file, fieldnames)
+        else:
+            rows = iter_json_array(file)
+        first = next(rows, None)
+        if first is None:
+            stats.finish()
+            return stats
+        value_fields = [field for field in first if field not in natural_key]
+        existing = {}
+        for values in model.objects.values_list(
+            'pk', *natural_key, *value_fields
+        ):
+            pk, values = values[0], values[1:]
+            existing[values[:len(natural_key)]] = (
+                pk, values[len(natural_key):]
+            )
+        to_create, to_update = [], []
 
-def load_table_from_json(model, file_name):
-    file = open(
-        BASE_DIR / f'static/data/{file_name}.json',
-        'r',
-        encoding='utf-8'
-    )
-    json_data_list = json.load(file)
-    model.objects.all().delete()
-    for json_data_obj in json_data_list:
-        model_obj = model(**json_data_obj)
-        model_obj.save()
+        for row in chain([first], rows):
+            key = tuple(row[field] for field in natural_key)
+            values = tuple(row[field] for field in value_fields)
+            pk, current = existing.get(key, (None, None))
+            if current is None:
+                to_create.append(model(**row))
+                stats.created += 1
+            elif pk is not None and current != values:
+                to_update.append(model(pk=pk, **row))
+                stats.updated += 1
+            else:
+                stats.skipped += 1
+            existing[key] = (pk, values)
+            if len(to_create) >= batch_size:
+                model.objects.bulk_create(to_create, batch_size=batch_size)
+                to_create.clear()
+            if len(to_update) >= batch_size:
+                model.objects.bulk_update(
+                    to_update, value_fields, batch_size=batch_size
+                )
+                to_update.clear()
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+        if to_update:
+            model.objects.bulk_update(
+                to_update, value_fields, batch_size=batch_size
+            )
+    stats.finish()
+    return stats
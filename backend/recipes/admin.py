@@ -50,6 +50,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'author',
         'text',
         'pub_date',
+        'favorites_count',
+        'carts_count',
     )
     search_fields = (
         'name',
@@ -0,0 +1,112 @@
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image
+
+from core.cache import recipe_response_cache
+from .models import Recipe
+
+
+IMAGE_VARIANTS = {
+    'thumbnail': (480, 480),
+    'webp': None,
+}
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_PROCESSING_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def build_variants(image):
+    """
+        Создаёт WebP варианты изображения рецепта.
+        Возвращает словарь {вариант: имя файла в хранилище}.
+    """
+    stem = os.path.splitext(os.path.basename(image.name))[0]
+    variants = {}
+    with image.open('rb'), Image.open(image) as original:
+        original = original.convert('RGB')
+        for variant, size in IMAGE_VARIANTS.items():
+            picture = original.copy()
+            if size:
+                picture.thumbnail(size)
+            buffer = io.BytesIO()
+            picture.save(buffer, 'WEBP', quality=80)
+            variants[variant] = image.storage.save(
+                f'recipes_img/variants/{stem}_{variant}.webp',
+                ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def has_variants(image, variants):
+    """Проверяет, что у изображения есть файлы всех вариантов."""
+    return set(variants) == set(IMAGE_VARIANTS) and all(
+        image.storage.exists(name) for name in variants.values()
+    )
+
+
+def delete_variants(storage, names, keep=()):
+    for name in set(names) - set(keep):
+        storage.delete(name)
+
+
+def discard_variants(recipe):
+    """Удаляет файлы вариантов изображения рецепта после коммита."""
+    storage = recipe.image.storage
+    names = list(recipe.image_variants.values())
+    transaction.on_commit(lambda: delete_variants(storage, names))
+
+
+def process_recipe_image(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    variants = build_variants(recipe.image)
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_variants=variants)
+    storage = recipe.image.storage
+    if updated:
+        recipe_response_cache.invalidate([recipe_id])
+        # Варианты прежнего изображения больше не нужны.
+        delete_variants(
+            storage, recipe.image_variants.values(), keep=variants.values()
+        )
+    else:
+        # Изображение заменили во время обработки.
+        delete_variants(storage, variants.values())
+
+
+def process_in_worker(recipe_id):
+    try:
+        process_recipe_image(recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(recipe):
+    """
+        Ставит обработку изображения в очередь после коммита транзакции.
+        При IMAGE_PROCESSING_ASYNC = False обработка идёт синхронно.
+        Очередь живёт в памяти процесса: задачи, не выполненные
+        до перезапуска воркера, доделывает regenerate_image_variants.
+    """
+    if settings.IMAGE_PROCESSING_ASYNC:
+        transaction.on_commit(
+            lambda: get_executor().submit(process_in_worker, recipe.pk)
+        )
+    else:
+        transaction.on_commit(lambda: process_recipe_image(recipe.pk))
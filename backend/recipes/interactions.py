@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from users.models import FollowingAuthor
+from .models import BasketRecipe, FavoriteRecipe
+
+
+class UserInteractions:
+    """
+        Id избранных рецептов, рецептов в корзине и авторов,
+        на которых подписан пользователь.
+    """
+
+    def __init__(self, favorites=(), carts=(), following=()):
+        self.favorites = frozenset(favorites)
+        self.carts = frozenset(carts)
+        self.following = frozenset(following)
+
+    @staticmethod
+    def querysets(user):
+        """Независимые запросы, из которых собирается UserInteractions."""
+        return {
+            'favorites': FavoriteRecipe.objects.filter(
+                user=user
+            ).values_list('recipe_id', flat=True),
+            'carts': BasketRecipe.objects.filter(
+                user=user
+            ).values_list('recipe_id', flat=True),
+            'following': FollowingAuthor.objects.filter(
+                user=user
+            ).values_list('author_id', flat=True),
+        }
+
+    @classmethod
+    def load(cls, user):
+        return cls(**cls.querysets(user))
+
+
+EMPTY_INTERACTIONS = UserInteractions()
+
+
+def cache_key(user_id):
+    return f'user-interactions:{user_id}'
+
+
+def invalidate_interactions(user_id):
+    if settings.USER_INTERACTIONS_CACHE_TIMEOUT:
+        cache.delete(cache_key(user_id))
+
+
+def reset_interactions(request):
+    """Сбрасывает загруженные в запросе данные после записи."""
+    request._user_interactions = None
+    invalidate_interactions(request.user.pk)
+
+
+def get_interactions(request):
+    """
+        Возвращает UserInteractions текущего пользователя.
+        Загружается не более одного раза за запрос, при заданном
+        USER_INTERACTIONS_CACHE_TIMEOUT хранится в django cache.
+    """
+    if request is None or not request.user.is_authenticated:
+        return EMPTY_INTERACTIONS
+    interactions = getattr(request, '_user_interactions', None)
+    if interactions is not None:
+        return interactions
+    timeout = settings.USER_INTERACTIONS_CACHE_TIMEOUT
+    key = cache_key(request.user.pk)
+    if timeout:
+        interactions = cache.get(key)
+    if interactions is None:
+        interactions = UserInteractions.load(request.user)
+        if timeout:
+            cache.set(key, interactions, timeout)
+    request._user_interactions = interactions
+    return interactions
@@ -0,0 +1,122 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:28
+
+from itertools import count
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+SLUG_MAX_LENGTH = 200
+
+
+def dedupe_tag_slugs(apps, schema_editor):
+    """
+        Слаг тегов становится уникальным: у самого раннего тега
+        с повторяющимся слагом он остаётся, остальные получают
+        слаг вида <slug>-<id>, связи с рецептами не меняются.
+    """
+    Tag = apps.get_model('recipes', 'Tag')
+    duplicates = list(
+        Tag.objects.exclude(slug=None).order_by().values('slug').annotate(
+            total=Count('pk')
+        ).filter(total__gt=1).values_list('slug', flat=True)
+    )
+    taken = set(Tag.objects.exclude(slug=None).values_list('slug', flat=True))
+    for slug in duplicates:
+        for tag in Tag.objects.filter(slug=slug).order_by('pk')[1:]:
+            for number in count(tag.pk):
+                suffix = f'-{number}'
+                candidate = slug[:SLUG_MAX_LENGTH - len(suffix)] + suffix
+                if candidate not in taken:
+                    break
+            taken.add(candidate)
+            tag.slug = candidate
+            tag.save(update_fields=['slug'])
+
+
+def create_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_pattern '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops);'
+    )
+
+
+def drop_pattern_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_name_pattern;'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0006_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientamount',
+            options={'verbose_name': 'Ингридиент', 'verbose_name_plural': 'Количество ингридиентов'},
+        ),
+        migrations.AlterField(
+            model_name='basketrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='carts', to='recipes.recipe', verbose_name='Рецепты в списке покупок'),
+        ),
+        migrations.AlterField(
+            model_name='basketrecipe',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='carts', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, help_text='Укажите понравившейся рецепт', on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='recipes.recipe', verbose_name='Репецт'),
+        ),
+        migrations.AlterField(
+            model_name='favoriterecipe',
+            name='user',
+            field=models.ForeignKey(db_index=False, help_text='Укажите пользователя', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='favorites', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='ingredientamount',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredientamounts', to='recipes.recipe', verbose_name='В каких рецептах'),
+        ),
+        migrations.AlterField(
+            model_name='recipe',
+            name='author',
+            field=models.ForeignKey(db_index=False, help_text='Укажите автора рецепта', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.RunPython(dedupe_tag_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(help_text='Укажите слуг', max_length=200, null=True, unique=True, validators=[django.core.validators.RegexValidator(message='Max length 200, regex [-a-zA-Z0-9_]+$', regex='^[-a-zA-Z0-9_]+$')], verbose_name='Слуг'),
+        ),
+        migrations.AddIndex(
+            model_name='basketrecipe',
+            index=models.Index(fields=['user', 'recipe'], name='basket_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favoriterecipe',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredientamount',
+            index=models.Index(fields=['recipe', 'ingredient'], include=('amount',), name='amount_recipe_ingredient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.RunPython(create_pattern_index, drop_pattern_index),
+    ]
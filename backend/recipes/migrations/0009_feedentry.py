@@ -0,0 +1,65 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+# Значение FEED_TIMELINE_THRESHOLD на момент создания миграции:
+# результат миграции не зависит от текущих настроек.
+# После смены порога ленты пересобирает manage.py rebuild_feeds.
+FEED_TIMELINE_THRESHOLD = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    FollowingAuthor = apps.get_model('users', 'FollowingAuthor')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    users = FollowingAuthor.objects.order_by().values('user').annotate(
+        total=Count('pk')
+    ).filter(total__gte=FEED_TIMELINE_THRESHOLD).values('user')
+    rows = Recipe.objects.filter(
+        author__following__user__in=users
+    ).order_by().values_list('author__following__user', 'pk', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id, pub_date=pub_date)
+            for user_id, recipe_id, pub_date in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_shoppinglistitem'),
+        ('users', '0007_followingauthor_author_user_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='feed_user_recipe'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 21:36
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_feedentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='basketrecipe',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='carts', to='recipes.recipe', verbose_name='Рецепты в списке покупок'),
+        ),
+    ]
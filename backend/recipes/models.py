@@ -1,6 +1,20 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import RegexValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    Count,
+    Exists,
+    F,
+    OuterRef,
+    Prefetch,
+    Subquery,
+    Sum,
+)
+from django.db.models.functions import Coalesce
+
+from users.models import FollowingAuthor
 
 
 User = get_user_model()
@@ -46,6 +60,7 @@ class Tag(models.Model):
     slug = models.SlugField(
         max_length=200,
         null=True,
+        unique=True,
         verbose_name='Слуг',
         help_text='Укажите слуг',
         validators=[
@@ -67,6 +82,59 @@ class Tag(models.Model):
         return self.name
 
 
+def count_by_recipe(model):
+    """Подзапрос количества строк model, связанных с рецептом."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(
+                recipe=OuterRef('pk')
+            ).order_by().values('recipe').annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        0
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    """QuerySet рецептов с подготовкой данных для чтения."""
+
+    def reconcile_counters(self):
+        """
+            Пересчитывает favorites_count / carts_count у рецептов,
+            где они разошлись с реальным числом записей.
+            Возвращает количество исправленных рецептов.
+        """
+        drifted = self.annotate(
+            actual_favorites=count_by_recipe(FavoriteRecipe),
+            actual_carts=count_by_recipe(BasketRecipe),
+        ).exclude(
+            favorites_count=F('actual_favorites'),
+            carts_count=F('actual_carts'),
+        )
+        return self.model.objects.filter(
+            pk__in=drifted.values('pk')
+        ).update(
+            favorites_count=count_by_recipe(FavoriteRecipe),
+            carts_count=count_by_recipe(BasketRecipe),
+        )
+
+    def for_read(self):
+        """
+            Загружает рецепты со всеми связанными данными
+            за фиксированное число запросов независимо от размера выборки.
+        """
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientamounts',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+
 class Recipe(models.Model):
     """БД Модель для хранения рецептов авторов."""
 
@@ -83,6 +151,7 @@ class Recipe(models.Model):
         related_name='recipes',
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
     )
     tags = models.ManyToManyField(
         Tag,
@@ -120,11 +189,43 @@ class Recipe(models.Model):
             MinValueValidator(1),
         ),
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        verbose_name='Варианты изображения',
+        default=dict,
+        editable=False,
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+            ),
+        )
 
     def __str__(self):
         return f'{self.id} - {self.name}'
@@ -138,6 +239,7 @@ class IngredientAmount(models.Model):
         verbose_name='В каких рецептах',
         related_name='ingredientamounts',
         on_delete=models.CASCADE,
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -156,7 +258,13 @@ class IngredientAmount(models.Model):
     class Meta:
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Количество ингридиентов'
-        ordering = ['recipe']
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'),
+                include=('amount', ),
+                name='amount_recipe_ingredient_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe} - {self.ingredient} - {self.amount}'
@@ -172,6 +280,7 @@ class FavoriteRecipe(models.Model):
         related_name='favorites',
         on_delete=models.SET_NULL,
         null=True,
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
@@ -179,6 +288,7 @@ class FavoriteRecipe(models.Model):
         help_text='Укажите понравившейся рецепт',
         related_name='favorites',
         on_delete=models.CASCADE,
+        db_index=False,
     )
 
     class Meta:
@@ -193,6 +303,12 @@ class FavoriteRecipe(models.Model):
                 name="Нельзя добавить рецепт в избранное более одного раза."
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'),
+                name='favorite_user_recipe_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user} - {self.recipe}"
@@ -206,12 +322,16 @@ class BasketRecipe(models.Model):
         related_name="carts",
         to=User,
         on_delete=models.CASCADE,
+        db_index=False,
     )
+    # Корзины удаляемого рецепта удаляет его обработчик pre_delete
+    # (recipes.signals) вместе с обновлением списков покупок.
     recipe = models.ForeignKey(
         verbose_name="Рецепты в списке покупок",
         related_name="carts",
         to=Recipe,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_index=False,
     )
 
     class Meta:
@@ -226,6 +346,310 @@ class BasketRecipe(models.Model):
                 name="Нельзя добавить рецепт в корзину более одного раза."
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('user', 'recipe'),
+                name='basket_user_recipe_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f"{self.user} - {self.recipe}"
+
+
+def insert_from_select(model, fields, rows, using):
+    """
+        INSERT ... SELECT: строки запроса rows вставляются в поля fields
+        таблицы model, не проходя через Python.
+        Возвращает количество вставленных строк.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    columns = ', '.join(
+        quote(model._meta.get_field(field).column) for field in fields
+    )
+    sql, params = rows.query.get_compiler(using).as_sql()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} ({columns}) {sql}',
+            params,
+        )
+        return cursor.rowcount
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """
+        QuerySet материализованного списка покупок.
+        Поддерживается инкрементально при изменении корзины
+        и ингредиентов рецептов.
+    """
+
+    batch_size = 1000
+
+    def apply_deltas(self, user_ids, deltas):
+        """
+            Добавляет к списку покупок пользователей user_ids
+            изменения количества {ingredient_id: delta}.
+            Позиции с неположительным количеством удаляются.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        # select_for_update работает только внутри транзакции.
+        with transaction.atomic(using=self.db):
+            self._apply_deltas(user_ids, deltas)
+
+    def _apply_deltas(self, user_ids, deltas):
+        existing = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=deltas
+            )
+        }
+        to_create, to_update, to_delete = [], [], []
+        for user_id in user_ids:
+            for ingredient_id, delta in deltas.items():
+                item = existing.get((user_id, ingredient_id))
+                if item is None:
+                    if delta > 0:
+                        to_create.append(self.model(
+                            user_id=user_id,
+                            ingredient_id=ingredient_id,
+                            amount=delta,
+                        ))
+                    continue
+                item.amount += delta
+                if item.amount > 0:
+                    to_update.append(item)
+                else:
+                    to_delete.append(item.pk)
+        self.bulk_create(to_create, batch_size=self.batch_size)
+        self.bulk_update(to_update, ['amount'], batch_size=self.batch_size)
+        if to_delete:
+            self.filter(pk__in=to_delete).delete()
+
+    def add_recipe(self, user_ids, recipe_id, sign=1):
+        """
+            Учитывает добавление (sign=1) или удаление (sign=-1)
+            рецепта из корзин пользователей user_ids.
+        """
+        self.apply_deltas(user_ids, {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientAmount.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('ingredient_id', 'amount')
+        })
+
+    def rebuild(self, user_ids=None):
+        """
+            Пересчитывает списки покупок по корзинам с нуля.
+            Возвращает количество созданных позиций.
+        """
+        items = self.all()
+        # Одно условие filter() - одно соединение с корзинами:
+        # второй filter() по recipe__carts добавил бы ещё одно,
+        # и количества умножались бы на число чужих корзин.
+        carts = {'recipe__carts__isnull': False}
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+            carts = {'recipe__carts__user_id__in': user_ids}
+        amounts = IngredientAmount.objects.filter(**carts)
+        items.delete()
+        rows = amounts.order_by().values(
+            'recipe__carts__user', 'ingredient'
+        ).annotate(total=Sum('amount')).values_list(
+            'recipe__carts__user', 'ingredient', 'total'
+        )
+        return insert_from_select(
+            self.model, ('user', 'ingredient', 'amount'), rows, self.db
+        )
+
+
+class ShoppingListItem(models.Model):
+    """БД Модель позиции материализованного списка покупок."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_items',
+        on_delete=models.CASCADE,
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='shopping_list_user_ingredient',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user} - {self.ingredient} - {self.amount}'
+
+
+class FeedQuerySet(models.QuerySet):
+    """
+        QuerySet материализованных лент подписок.
+        Ленты ведутся только для пользователей, подписанных не менее
+        чем на FEED_TIMELINE_THRESHOLD авторов: новый рецепт сразу
+        раскладывается по их лентам (fan-out on write).
+        Остальным лента собирается при чтении.
+    """
+
+    batch_size = 1000
+
+    def timeline_users(self, user_ids=None):
+        """Пользователи из user_ids с материализованной лентой."""
+        threshold = settings.FEED_TIMELINE_THRESHOLD
+        if not threshold:
+            return []
+        follows = FollowingAuthor.objects.all()
+        if user_ids is not None:
+            follows = follows.filter(user_id__in=user_ids)
+        return list(
+            follows.order_by().values('user').annotate(
+                total=Count('pk')
+            ).filter(total__gte=threshold).values_list('user', flat=True)
+        )
+
+    def timeline_followers(self, author_id):
+        """
+            Подписчики автора с материализованной лентой.
+            Подписки каждого подписчика читаются по индексу (user, author)
+            не дальше FEED_TIMELINE_THRESHOLD-й, без подсчёта всех.
+        """
+        threshold = settings.FEED_TIMELINE_THRESHOLD
+        if not threshold:
+            return []
+        enough_follows = FollowingAuthor.objects.filter(
+            user_id=OuterRef('user_id')
+        ).order_by()[threshold - 1:threshold]
+        return list(
+            FollowingAuthor.objects.filter(
+                Exists(enough_follows), author_id=author_id
+            ).values_list('user_id', flat=True)
+        )
+
+    def insert(self, rows):
+        """
+            rows - кортежи (user_id, recipe_id, pub_date).
+            Уже существующие записи пропускаются.
+        """
+        batch = []
+        for user_id, recipe_id, pub_date in rows:
+            batch.append(self.model(
+                user_id=user_id, recipe_id=recipe_id, pub_date=pub_date
+            ))
+            if len(batch) >= self.batch_size:
+                self.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        self.bulk_create(batch, ignore_conflicts=True)
+
+    def fan_out(self, recipe):
+        """Добавляет новый рецепт в ленты подписчиков автора."""
+        self.insert(
+            (user_id, recipe.pk, recipe.pub_date)
+            for user_id in self.timeline_followers(recipe.author_id)
+        )
+
+    def follow(self, user_id, author_id):
+        total = FollowingAuthor.objects.filter(user_id=user_id).count()
+        threshold = settings.FEED_TIMELINE_THRESHOLD
+        if not threshold or total < threshold:
+            return
+        if total == threshold:
+            self.rebuild([user_id])
+            return
+        self.insert(
+            (user_id, recipe_id, pub_date)
+            for recipe_id, pub_date in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('pk', 'pub_date').iterator()
+        )
+
+    def unfollow(self, user_id, author_id):
+        total = FollowingAuthor.objects.filter(user_id=user_id).count()
+        if total < settings.FEED_TIMELINE_THRESHOLD:
+            self.filter(user_id=user_id).delete()
+        else:
+            self.filter(user_id=user_id, recipe__author_id=author_id).delete()
+
+    def rebuild(self, user_ids=None):
+        """
+            Пересобирает ленты с нуля.
+            Возвращает количество созданных записей.
+        """
+        entries = self.all()
+        if user_ids is not None:
+            entries = entries.filter(user_id__in=user_ids)
+        entries.delete()
+        users = self.timeline_users(user_ids)
+        if not users:
+            return 0
+        return insert_from_select(
+            self.model,
+            ('user', 'recipe', 'pub_date'),
+            Recipe.objects.filter(
+                author__following__user__in=users
+            ).order_by().values_list(
+                'author__following__user', 'pk', 'pub_date'
+            ),
+            self.db,
+        )
+
+
+class FeedEntry(models.Model):
+    """БД Модель записи материализованной ленты подписок."""
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        related_name='feed',
+        on_delete=models.CASCADE,
+        db_index=False,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        related_name='feed_entries',
+        on_delete=models.CASCADE,
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    objects = FeedQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='feed_user_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-recipe'),
+                name='feed_user_pub_date_idx',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user} - {self.recipe}'
@@ -0,0 +1,281 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import (
+    Case,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+    When,
+)
+
+from core.cache import CacheVersion, ingredients_cache
+from .models import Ingredient, IngredientAmount, Recipe
+
+
+INGREDIENT_SEARCH_LIMIT = 30
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска без учёта регистра."""
+    return value.strip().casefold()
+
+
+class IngredientPrefixIndex:
+    """
+        Отсортированный индекс названий ингредиентов в памяти процесса.
+        Используется, когда база данных не PostgreSQL.
+        Перестраивается при смене версии справочника ингредиентов
+        и не реже, чем раз в REFERENCE_DATA_CACHE_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._index = None
+
+    def get_index(self):
+        version = ingredients_cache.get_version()
+        if (
+            self._index is None
+            or self._index[0] != version
+            or ingredients_cache.expired(self._index[1])
+        ):
+            entries = sorted(
+                (normalize(name), pk)
+                for pk, name in Ingredient.objects.values_list('id', 'name')
+            )
+            self._index = (
+                version,
+                ingredients_cache.deadline(),
+                [key for key, _ in entries],
+                entries,
+            )
+        return self._index
+
+    def search(self, query, limit=INGREDIENT_SEARCH_LIMIT):
+        """
+            Возвращает id ингредиентов: сначала совпадения по началу
+            названия, затем по вхождению подстроки.
+        """
+        _, _, keys, entries = self.get_index()
+        query = normalize(query)
+        result = []
+        for key, pk in entries[bisect.bisect_left(keys, query):]:
+            if not key.startswith(query) or len(result) >= limit:
+                break
+            result.append(pk)
+        found = set(result)
+        for key, pk in entries:
+            if len(result) >= limit:
+                break
+            if query in key and pk not in found:
+                result.append(pk)
+        return result
+
+
+ingredient_index = IngredientPrefixIndex()
+
+
+def search_ingredients(queryset, query, limit=INGREDIENT_SEARCH_LIMIT):
+    """
+        Поиск ингредиентов для автодополнения.
+        В PostgreSQL сначала проверяются совпадения по префиксу
+        (btree индекс text_pattern_ops по UPPER(name)): если их не меньше
+        limit, поиск подстроки по триграммному индексу не нужен.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        prefix = queryset.filter(name__istartswith=query)
+        if prefix[limit - 1:limit].exists():
+            return prefix.order_by('name')[:limit]
+        return queryset.filter(name__icontains=query).annotate(
+            rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('rank', 'name')[:limit]
+    ids = ingredient_index.search(query, limit)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(
+        Case(
+            *[When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+    )
+
+
+SEARCH_CONFIG = 'russian'
+# Веса полей одинаковы для обоих бэкендов: название, описание, ингредиенты.
+SEARCH_WEIGHTS = {'name': 'A', 'text': 'B', 'ingredients': 'C'}
+FALLBACK_WEIGHTS = {'A': 3, 'B': 2, 'C': 1}
+RUSSIAN_ENDINGS = sorted(
+    (
+        'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя',
+        'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ам', 'ям', 'ах', 'ях',
+        'ом', 'ем', 'ов', 'ев', 'ей', 'ую', 'юю', 'а', 'я', 'о', 'е', 'ы',
+        'и', 'у', 'ю', 'ь',
+    ),
+    key=len,
+    reverse=True,
+)
+WORD_RE = re.compile(r'\w+')
+
+recipe_search_version = CacheVersion('recipe-search')
+_pending_vectors = threading.local()
+
+
+def stem(word):
+    """Упрощённый стеммер: отбрасывает типичные окончания."""
+    word = word.casefold().replace('ё', 'е')
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(value):
+    return {stem(word) for word in WORD_RE.findall(value or '')}
+
+
+class RecipeInvertedIndex:
+    """
+        Инвертированный индекс рецептов в памяти процесса:
+        основа слова -> {id рецепта: вес}.
+        Используется, когда база данных не PostgreSQL.
+    """
+
+    def __init__(self):
+        self._index = None
+
+    def get_index(self):
+        version = recipe_search_version.get_version()
+        if self._index is None or self._index[0] != version:
+            postings = defaultdict(dict)
+            ingredients = defaultdict(list)
+            for recipe_id, name in IngredientAmount.objects.values_list(
+                'recipe_id', 'ingredient__name'
+            ):
+                ingredients[recipe_id].append(name)
+            for pk, name, text in Recipe.objects.values_list(
+                'pk', 'name', 'text'
+            ):
+                fields = {
+                    'name': name,
+                    'text': text,
+                    'ingredients': ' '.join(ingredients[pk]),
+                }
+                for field, value in fields.items():
+                    for token in tokenize(value):
+                        postings[token][pk] = max(
+                            postings[token].get(pk, 0),
+                            FALLBACK_WEIGHTS[SEARCH_WEIGHTS[field]]
+                        )
+            self._index = (version, postings)
+        return self._index[1]
+
+    def search(self, query):
+        """Возвращает id рецептов, содержащих все слова запроса."""
+        postings = self.get_index()
+        scores = None
+        for token in tokenize(query):
+            matches = postings.get(token, {})
+            if scores is None:
+                scores = dict(matches)
+            else:
+                scores = {
+                    pk: score + matches[pk]
+                    for pk, score in scores.items() if pk in matches
+                }
+        return sorted(scores or {}, key=lambda pk: -scores[pk])
+
+
+recipe_index = RecipeInvertedIndex()
+
+
+def fill_search_vectors(queryset):
+    """Пересчитывает поисковые векторы рецептов queryset одним UPDATE."""
+    if connections[queryset.db].vendor != 'postgresql':
+        recipe_search_version.bump()
+        return
+    ingredients = IngredientAmount.objects.filter(
+        recipe=OuterRef('pk')
+    ).values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    queryset.update(
+        search_vector=(
+            SearchVector(
+                'name', weight=SEARCH_WEIGHTS['name'], config=SEARCH_CONFIG
+            )
+            + SearchVector(
+                'text', weight=SEARCH_WEIGHTS['text'], config=SEARCH_CONFIG
+            )
+            + SearchVector(
+                Subquery(ingredients),
+                weight=SEARCH_WEIGHTS['ingredients'],
+                config=SEARCH_CONFIG,
+            )
+        )
+    )
+
+
+def flush_search_vectors(using):
+    pending = _pending_vectors.__dict__.pop(using, None)
+    if pending:
+        fill_search_vectors(
+            Recipe.objects.using(using).filter(pk__in=pending)
+        )
+
+
+def refresh_search_vectors(recipe_ids, using=DEFAULT_DB_ALIAS):
+    """
+        Откладывает пересчёт векторов рецептов recipe_ids до коммита:
+        все изменения транзакции дают один UPDATE.
+        Без PostgreSQL индекс в памяти сбрасывается сразу и после коммита.
+    """
+    if connections[using].vendor != 'postgresql':
+        recipe_search_version.bump()
+        transaction.on_commit(recipe_search_version.bump, using)
+        return
+    _pending_vectors.__dict__.setdefault(using, set()).update(recipe_ids)
+    transaction.on_commit(lambda: flush_search_vectors(using), using)
+
+
+def invalidate_search_index(using=DEFAULT_DB_ALIAS):
+    """Сбрасывает индекс в памяти; в PostgreSQL его нет."""
+    if connections[using].vendor != 'postgresql':
+        recipe_search_version.bump()
+
+
+def search_recipes(queryset, query):
+    """
+        Полнотекстовый поиск рецептов по названию, описанию
+        и ингредиентам, результаты упорядочены по релевантности.
+    """
+    if connections[queryset.db].vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date')
+    ids = recipe_index.search(query)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(pk__in=ids).order_by(
+        Case(
+            *[When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids)],
+            output_field=IntegerField(),
+        )
+    )
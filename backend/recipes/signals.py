@@ -0,0 +1,228 @@
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
+
+from core.cache import (
+    ingredients_cache,
+    recipe_response_cache,
+    tags_cache,
+)
+from users.models import FollowingAuthor
+from .interactions import invalidate_interactions
+from .models import (
+    BasketRecipe,
+    FavoriteRecipe,
+    FeedEntry,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingListItem,
+    Tag,
+    User,
+)
+from .search import (
+    fill_search_vectors,
+    invalidate_search_index,
+    refresh_search_vectors,
+)
+
+
+# Корзины удаляемого рецепта учитываются одним apply_deltas,
+# построчные обработчики их удаления пропускаются.
+deleting_recipe_carts = ContextVar('deleting_recipe_carts', default=False)
+
+
+def is_recipe_cart_delete(sender):
+    return sender is BasketRecipe and deleting_recipe_carts.get()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredients_version(**kwargs):
+    ingredients_cache.bump()
+    recipe_response_cache.bump()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def bump_tags_version(**kwargs):
+    tags_cache.bump()
+    recipe_response_cache.bump()
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=BasketRecipe)
+@receiver(post_delete, sender=BasketRecipe)
+@receiver(post_save, sender=FollowingAuthor)
+@receiver(post_delete, sender=FollowingAuthor)
+def invalidate_user_interactions(instance, sender, **kwargs):
+    """
+        Сбрасывает кэш UserInteractions сразу и после коммита:
+        параллельный запрос мог закэшировать старые данные до коммита.
+    """
+    if is_recipe_cart_delete(sender) or instance.user_id is None:
+        return
+    user_id = instance.user_id
+
+    def invalidate():
+        invalidate_interactions(user_id)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_delete, sender=Recipe)
+def bump_recipe_search_version(using, **kwargs):
+    invalidate_search_index(using)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_vector(instance, using, update_fields, **kwargs):
+    if update_fields and not {'name', 'text'} & set(update_fields):
+        return
+    refresh_search_vectors([instance.pk], using)
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def update_ingredients_search_vector(instance, using, **kwargs):
+    refresh_search_vectors([instance.recipe_id], using)
+
+
+@receiver(post_save, sender=Ingredient)
+def update_renamed_ingredient_search_vectors(instance, created, **kwargs):
+    if not created:
+        fill_search_vectors(Recipe.objects.filter(ingredients=instance))
+
+
+def invalidate_recipe_responses(recipe_ids, lists=True):
+    """
+        Сбрасывает кэш ответов рецептов сразу и ещё раз после коммита:
+        ответы, закэшированные параллельными запросами до коммита,
+        содержат старые данные.
+    """
+    recipe_ids = [pk for pk in recipe_ids if pk is not None]
+
+    def invalidate():
+        recipe_response_cache.invalidate(recipe_ids, lists)
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    invalidate_recipe_responses([instance.pk])
+
+
+@receiver(post_save, sender=IngredientAmount)
+@receiver(post_delete, sender=IngredientAmount)
+def invalidate_related_recipe(instance, **kwargs):
+    invalidate_recipe_responses([instance.recipe_id])
+
+
+@receiver(post_save, sender=FavoriteRecipe)
+@receiver(post_delete, sender=FavoriteRecipe)
+@receiver(post_save, sender=BasketRecipe)
+@receiver(post_delete, sender=BasketRecipe)
+def invalidate_recipe_counters(instance, sender, **kwargs):
+    """
+        Счётчики избранного и корзин меняются при каждом действии
+        пользователей: сбрасывается только ответ рецепта, в кэшированных
+        списках счётчики обновляются по RECIPE_RESPONSE_CACHE_TIMEOUT.
+    """
+    if is_recipe_cart_delete(sender):
+        return
+    invalidate_recipe_responses([instance.recipe_id], lists=False)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        if pk_set is None:
+            recipe_response_cache.bump()
+            return
+        invalidate_recipe_responses(pk_set)
+    else:
+        invalidate_recipe_responses([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields, **kwargs):
+    if created:
+        return
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_recipe_responses(
+        instance.recipes.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_author(**kwargs):
+    recipe_response_cache.bump()
+
+
+@receiver(post_save, sender=BasketRecipe)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        ShoppingListItem.objects.add_recipe(
+            [instance.user_id], instance.recipe_id
+        )
+
+
+@receiver(post_delete, sender=BasketRecipe)
+def remove_from_shopping_list(instance, sender, **kwargs):
+    if is_recipe_cart_delete(sender):
+        return
+    ShoppingListItem.objects.add_recipe(
+        [instance.user_id], instance.recipe_id, -1
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_deleted_recipe_from_carts(instance, **kwargs):
+    """
+        Корзины удаляются до каскада, пока ингредиенты рецепта на месте.
+        Списки покупок всех владельцев корзин обновляются одним
+        apply_deltas. Ответы рецепта сбрасывает его собственное удаление,
+        а id удалённого рецепта в кэше UserInteractions ни с чем
+        не совпадёт, поэтому построчные обработчики не нужны.
+    """
+    user_ids = list(instance.carts.values_list('user_id', flat=True))
+    if not user_ids:
+        return
+    ShoppingListItem.objects.add_recipe(user_ids, instance.pk, -1)
+    token = deleting_recipe_carts.set(True)
+    try:
+        instance.carts.all().delete()
+    finally:
+        deleting_recipe_carts.reset(token)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.fan_out(instance)
+
+
+@receiver(post_save, sender=FollowingAuthor)
+def add_author_to_feed(instance, created, **kwargs):
+    if created:
+        FeedEntry.objects.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=FollowingAuthor)
+def remove_author_from_feed(instance, **kwargs):
+    FeedEntry.objects.unfollow(instance.user_id, instance.author_id)
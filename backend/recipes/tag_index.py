@@ -0,0 +1,57 @@
+from django.db.models import Exists, OuterRef
+
+from core.cache import tags_cache
+from .models import Recipe, Tag
+
+
+RecipeTag = Recipe.tags.through
+
+
+class TagSlugIndex:
+    """
+        Отображение slug -> id тегов в памяти процесса.
+        Перестраивается при смене версии справочника тегов
+        и не реже, чем раз в REFERENCE_DATA_CACHE_TIMEOUT секунд.
+    """
+
+    def __init__(self):
+        self._index = None
+
+    def get_index(self):
+        version = tags_cache.get_version()
+        if (
+            self._index is None
+            or self._index[0] != version
+            or tags_cache.expired(self._index[1])
+        ):
+            self._index = (
+                version,
+                tags_cache.deadline(),
+                dict(Tag.objects.values_list('slug', 'id')),
+            )
+        return self._index[2]
+
+    def get_ids(self, slugs):
+        index = self.get_index()
+        return [index[slug] for slug in slugs if slug in index]
+
+
+tag_index = TagSlugIndex()
+
+
+def filter_by_tags(queryset, slugs):
+    """
+        Рецепты, у которых есть хотя бы один из тегов.
+        EXISTS по уникальному индексу (recipe_id, tag_id) таблицы связи
+        не размножает строки и не требует DISTINCT.
+    """
+    ids = tag_index.get_ids(slugs)
+    if not ids:
+        return queryset.none()
+    return queryset.filter(
+        Exists(
+            RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=ids
+            )
+        )
+    )
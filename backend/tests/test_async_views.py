@@ -0,0 +1,169 @@
+import asyncio
+import re
+
+from django.test import AsyncClient, override_settings
+from django.urls import include, path
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APITransactionTestCase
+from api.v1.async_views import async_urlpatterns
+from core.metrics import registry
+from recipes.models import Recipe, Tag
+
+from .test_recipes import BaseRecipeTest
+
+
+urlpatterns = [
+    path('async/api/', include(async_urlpatterns)),
+    path('api/', include('api.urls', namespace='api')),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class AsyncReadViewsTest(APITransactionTestCase):
+    """
+        Запросы асинхронных view выполняются в других потоках,
+        поэтому данные должны быть закоммичены.
+    """
+
+    setUp = BaseRecipeTest.setUp
+    create_recipes = BaseRecipeTest.create_recipes
+
+    def get_both(self, url):
+        sync_response = self.client.get(f'/api/{url}')
+        async_response = self.client.get(f'/async/api/{url}')
+        self.assertEquals(sync_response.status_code, status.HTTP_200_OK)
+        self.assertEquals(async_response.status_code, status.HTTP_200_OK)
+        return (
+            sync_response.content.decode(),
+            async_response.content.decode().replace('/async/api/', '/api/'),
+        )
+
+    def assertSameResponses(self, url):
+        sync_content, async_content = self.get_both(url)
+        self.assertJSONEqual(async_content, sync_content)
+
+    def test_recipe_list_matches_sync_view(self):
+        self.create_recipes(8)
+        author = Recipe.objects.first().author
+        for url in (
+            'recipes/',
+            'recipes/?is_favorited=1&page=2',
+            'recipes/?is_in_shopping_cart=1&tags=lunch',
+        ):
+            self.assertSameResponses(url)
+        self.client.force_authenticate(None)
+        for url in (
+            'recipes/',
+            'recipes/?page=2',
+            'recipes/?page=2&tags=lunch&tags=breakfast',
+            f'recipes/?tags=lunch&author={author.pk}',
+        ):
+            self.assertSameResponses(url)
+        for url in (
+            'recipes/?page=x',
+            'recipes/?author=0',
+            'recipes/?page=5',
+        ):
+            sync_response = self.client.get(f'/api/{url}')
+            async_response = self.client.get(f'/async/api/{url}')
+            self.assertEquals(
+                async_response.status_code, sync_response.status_code
+            )
+
+    def test_recipe_list_falls_back_to_sync_view(self):
+        self.create_recipes(2)
+        self.client.force_authenticate(None)
+        response = self.client.get('/async/api/recipes/?page=5')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get('/async/api/recipes/?cursor=')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('previous', response.json())
+        response = self.client.get(
+            '/async/api/recipes/', HTTP_AUTHORIZATION='Token wrong'
+        )
+        self.assertEquals(
+            response.status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        response = self.client.post('/async/api/recipes/', {})
+        self.assertEquals(
+            response.status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    def test_post_is_not_rejected_by_csrf(self):
+        token = Token.objects.create(user=self.user)
+        client = APIClient(enforce_csrf_checks=True)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        for url in ('/api/recipes/', '/async/api/recipes/'):
+            response = client.post(url, {}, format='json')
+            self.assertEquals(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+
+    def test_anonymous_list_is_cached(self):
+        self.create_recipes(1)
+        self.client.force_authenticate(None)
+        response = self.client.get('/async/api/recipes/')
+        self.assertEquals(response['Cache-Control'], 'public, max-age=0')
+        self.assertEquals(
+            self.client.get(
+                '/async/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+            ).status_code,
+            status.HTTP_304_NOT_MODIFIED
+        )
+        self.client.force_authenticate(self.user)
+        response = self.client.get('/async/api/recipes/')
+        self.assertEquals(response['Cache-Control'], 'private')
+
+    def test_reference_data(self):
+        for url in ('tags/', 'ingredients/?name=кап'):
+            self.assertSameResponses(url)
+            self.assertSameResponses(url)
+        Tag.objects.create(name='Ужин', color='#8775D2', slug='dinner')
+        sync_content, async_content = self.get_both('tags/')
+        self.assertIn('dinner', async_content)
+
+    async def test_concurrent_requests(self):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.create_recipes, 3
+        )
+        token = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: Token.objects.create(user=self.user).key
+        )
+        client = AsyncClient()
+        responses = await asyncio.gather(*(
+            client.get('/async/api/recipes/', authorization=f'Token {token}')
+            for _ in range(5)
+        ))
+        for response in responses:
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            self.assertEquals(response.json()['count'], 3)
+            self.assertTrue(all(
+                recipe['is_favorited']
+                for recipe in response.json()['results']
+            ))
+
+    async def test_metrics_and_download_under_asgi(self):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self.create_recipes, 2
+        )
+        token = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: Token.objects.create(user=self.user).key
+        )
+        registry.clear()
+        client = AsyncClient()
+        response = await client.get(
+            '/async/api/recipes/', authorization=f'Token {token}'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        queries = re.search(
+            r'foodgram_db_queries_sum{view="recipe_list",method="GET"} (\S+)',
+            registry.render()
+        )
+        self.assertTrue(float(queries.group(1)) > 0)
+        response = await client.get(
+            '/api/recipes/download_shopping_cart/?format=txt',
+            authorization=f'Token {token}'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Капуста', b''.join(response).decode())
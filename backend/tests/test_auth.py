@@ -0,0 +1,97 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from core.cache import token_cache
+from core.checks import check_token_cache
+from recipes.models import User
+
+
+@override_settings(TOKEN_CACHE_TIMEOUT=60)
+class TokenCacheTest(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            email='reader@yandex.ru',
+            username='reader',
+            first_name='reader',
+            last_name='reader',
+            password='Qwerty123qwe123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_me(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/users/me/')
+        token_queries = [
+            query for query in queries.captured_queries
+            if 'authtoken_token' in query['sql']
+        ]
+        return response, token_queries
+
+    def test_token_lookup_is_cached(self):
+        response, token_queries = self.get_me()
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(token_queries), 1)
+        response, token_queries = self.get_me()
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['email'], 'reader@yandex.ru')
+        self.assertEquals(token_queries, [])
+
+    def test_logout_invalidates(self):
+        self.get_me()
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        response, _ = self.get_me()
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_and_deactivation_invalidate(self):
+        self.get_me()
+        self.user.set_password('Asdfgh456asd456')
+        self.user.save()
+        _, token_queries = self.get_me()
+        self.assertEquals(len(token_queries), 1)
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get_me()
+        self.assertEquals(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_CACHE_MAX_ENTRIES=1)
+    def test_cache_is_bounded(self):
+        other = User.objects.create(email='other@yandex.ru', username='other')
+        other_token = Token.objects.create(user=other)
+        self.get_me()
+        token_cache.set(other_token.key, other)
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEquals(token_cache.get(other_token.key), other)
+
+    @override_settings(TOKEN_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.get_me()
+        _, token_queries = self.get_me()
+        self.assertEquals(len(token_queries), 1)
+
+    @override_settings(TOKEN_CACHE_SHARED=True)
+    def test_shared_cache(self):
+        self.get_me()
+        token_cache.clear()
+        _, token_queries = self.get_me()
+        self.assertEquals(token_queries, [])
+        User.objects.get(pk=self.user.pk).save()
+        token_cache.clear()
+        _, token_queries = self.get_me()
+        self.assertEquals(len(token_queries), 1)
+
+    def test_process_local_cache_check(self):
+        self.assertEquals(
+            [warning.id for warning in check_token_cache(None)],
+            ['core.W002']
+        )
+        with override_settings(TOKEN_CACHE_TIMEOUT=0):
+            self.assertEquals(check_token_cache(None), [])
@@ -0,0 +1,173 @@
+import io
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from django.db.models import F, Sum
+from core.cache import recipe_response_cache
+from core.synthetic import ZipfSyntheticDataGenerator
+from recipes.models import (
+    BasketRecipe,
+    FavoriteRecipe,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    Tag,
+    User,
+)
+from users.models import FollowingAuthor
+
+
+class LoadReferenceDataTest(TestCase):
+
+    def load(self, command, *args):
+        out = io.StringIO()
+        call_command(command, *args, stdout=out)
+        return out.getvalue()
+
+    def test_load_ingredients_json_and_csv(self):
+        output = self.load('set_default_ingredients', '--batch-size', '100')
+        self.assertIn('rows/sec', output)
+        count = Ingredient.objects.count()
+        self.assertTrue(count > 2000)
+
+        self.load('set_default_ingredients', '--format', 'csv')
+        self.assertEquals(Ingredient.objects.count(), count)
+
+    def test_reload_keeps_foreign_keys(self):
+        self.load('set_default_ingredients')
+        ingredient = Ingredient.objects.get(
+            name='абрикосовое варенье', measurement_unit='г'
+        )
+        recipe = Recipe.objects.create(
+            name='Рецепт', text='Описание', cooking_time=10
+        )
+        IngredientAmount.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=1
+        )
+        self.load('set_default_ingredients')
+        self.assertTrue(
+            IngredientAmount.objects.filter(ingredient=ingredient).exists()
+        )
+
+    def test_load_tags_updates_changed_rows(self):
+        Tag.objects.create(name='Старое имя', color='#000000', slug='lunch')
+        version = recipe_response_cache.get_version()
+        output = self.load('set_default_tags')
+        self.assertIn('updated: 1', output)
+        self.assertNotEquals(recipe_response_cache.get_version(), version)
+        self.assertEquals(Tag.objects.count(), 6)
+        self.assertEquals(Tag.objects.get(slug='lunch').name, 'Обед')
+
+
+class BenchmarkApiTest(TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.baseline = os.path.join(directory, 'baseline.json')
+        self.key = f'{connection.vendor}:tiny'
+
+    def benchmark(self, *args):
+        out = io.StringIO()
+        call_command(
+            'benchmark_api', '--scale', 'tiny', '--iterations', '3',
+            '--baseline', self.baseline, *args, stdout=out
+        )
+        return out.getvalue()
+
+    def test_update_and_compare_baseline(self):
+        output = self.benchmark('--update-baseline')
+        self.assertIn('subscriptions: p50', output)
+        with open(self.baseline) as file:
+            baseline = json.load(file)
+        self.assertEquals(
+            set(baseline[self.key]),
+            {'recipes', 'subscriptions', 'ingredients', 'shopping_cart'}
+        )
+        output = self.benchmark('--tolerance', '1000')
+        self.assertIn('No regressions', output)
+
+    def test_query_regression_fails(self):
+        self.benchmark('--update-baseline')
+        with open(self.baseline) as file:
+            baseline = json.load(file)
+        baseline[self.key]['recipes']['queries'] = 1
+        with open(self.baseline, 'w') as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, 'recipes:'):
+            self.benchmark('--tolerance', '1000')
+
+
+class GenerateFixturesTest(TestCase):
+
+    def generate(self, *args):
+        out = io.StringIO()
+        call_command(
+            'generate_fixtures', '--scale', 'tiny', '--no-copy', *args,
+            stdout=out
+        )
+        return out.getvalue()
+
+    def test_generate_counts(self):
+        output = self.generate('--users', '10', '--recipes', '50')
+        self.assertIn('rows/sec', output)
+        self.assertEquals(User.objects.count(), 10)
+        self.assertEquals(Recipe.objects.count(), 50)
+        self.assertEquals(IngredientAmount.objects.count(), 150)
+        self.assertEquals(FollowingAuthor.objects.count(), 30)
+        self.assertEquals(BasketRecipe.objects.count(), 30)
+        self.assertEquals(
+            Recipe.objects.aggregate(total=Sum('favorites_count'))['total'],
+            FavoriteRecipe.objects.count(),
+        )
+        self.assertEquals(Recipe.objects.reconcile_counters(), 0)
+        self.assertFalse(
+            FollowingAuthor.objects.filter(user=F('author')).exists()
+        )
+
+    def test_popularity_is_skewed(self):
+        self.generate(
+            '--users', '100', '--recipes', '500', '--favorites', '20',
+            '--exponent', '1.2',
+        )
+        counts = list(Recipe.objects.order_by(
+            '-favorites_count'
+        ).values_list('favorites_count', flat=True))
+        self.assertTrue(counts[0] > 10 * counts[len(counts) // 2])
+
+    def test_sample_whole_population(self):
+        generator = ZipfSyntheticDataGenerator(
+            users=0, recipes=0, ingredients_per_recipe=0,
+            follows=0, favorites=0, carts=0, exponent=3,
+        )
+        population = range(2000)
+        self.assertEquals(
+            generator.pick_recipes(population, 5000), list(population)
+        )
+        self.assertEquals(
+            generator.pick_authors(population, 2000, 7),
+            [value for value in population if value != 7],
+        )
+
+    def test_same_seed_same_data(self):
+        self.generate('--seed', '7')
+        first = list(
+            FavoriteRecipe.objects.order_by('id').values_list(
+                'user__username', 'recipe__name'
+            )
+        )
+        FavoriteRecipe.objects.all().delete()
+        self.generate('--seed', '7', '--prefix', 'again')
+        second = list(
+            FavoriteRecipe.objects.order_by('id').values_list(
+                'user__username', 'recipe__name'
+            )
+        )
+        self.assertEquals(
+            [(user.replace('synthetic', 'again'), name)
+             for user, name in first],
+            second,
+        )
@@ -0,0 +1,138 @@
+import threading
+
+from django.test import SimpleTestCase
+from core.db import pool as db_pool
+from core.db.backends.postgresql.base import DatabaseWrapper
+from core.db.pool import ConnectionPool, PoolTimeout, get_pool
+from core.metrics import registry
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.closed = False
+        self.rollbacks = 0
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def make_pool(self, max_size=2, is_usable=None):
+        return ConnectionPool(
+            FakeConnection, max_size, timeout=0.05, is_usable=is_usable
+        )
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool()
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEquals(connection.rollbacks, 1)
+        self.assertEquals(pool.stats()['opened'], 1)
+        self.assertEquals(pool.stats()['acquired'], 2)
+
+    def test_size_is_bounded(self):
+        pool = self.make_pool(max_size=1)
+        connection = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEquals(pool.stats()['timeouts'], 1)
+        threading.Timer(0.01, pool.release, (connection, )).start()
+        pool.timeout = 1
+        self.assertIs(pool.acquire(), connection)
+
+    def test_broken_connections_are_discarded(self):
+        pool = self.make_pool(is_usable=lambda connection: False)
+        first = pool.acquire()
+        pool.release(first)
+        second = pool.acquire()
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        pool.release(second, discard=True)
+        self.assertTrue(second.closed)
+        self.assertEquals(
+            pool.stats(),
+            {
+                'max_size': 2,
+                'in_use': 0,
+                'idle': 0,
+                'opened': 2,
+                'acquired': 2,
+                'timeouts': 0,
+                'wait_seconds': pool.stats()['wait_seconds'],
+            }
+        )
+
+    def test_pool_metrics(self):
+        pool = get_pool('test-metrics', self.make_pool)
+        self.addCleanup(db_pool._pools.pop, 'test-metrics')
+        self.assertIs(get_pool('test-metrics', None), pool)
+        pool.acquire()
+        text = registry.render()
+        self.assertIn(
+            'foodgram_db_pool_connections{alias="test-metrics",'
+            'state="in_use"} 1',
+            text
+        )
+        self.assertIn(
+            'foodgram_db_pool_events_total{alias="test-metrics",'
+            'event="opened"} 1',
+            text
+        )
+        self.assertIn('# TYPE foodgram_db_pool_wait_seconds_total counter',
+                      text)
+
+
+class FakeDatabaseWrapper(DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        return FakeConnection()
+
+    def init_connection_state(self):
+        pass
+
+
+class HealthCheckTest(SimpleTestCase):
+
+    def make_wrapper(self, usable):
+        wrapper = FakeDatabaseWrapper({
+            'ENGINE': 'core.db.backends.postgresql',
+            'NAME': 'foodgram',
+            'USER': '',
+            'PASSWORD': '',
+            'HOST': '',
+            'PORT': '',
+            'OPTIONS': {},
+            'TIME_ZONE': None,
+            'AUTOCOMMIT': True,
+            'ATOMIC_REQUESTS': False,
+            'CONN_MAX_AGE': 60,
+            'HEALTH_CHECKS': True,
+        })
+        wrapper.connect()
+        wrapper.is_usable = lambda: usable
+        return wrapper
+
+    def test_unusable_connection_is_closed_once_per_request(self):
+        wrapper = self.make_wrapper(usable=False)
+        connection = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertTrue(connection.closed)
+        self.assertIsNot(wrapper.connection, connection)
+        reconnected = wrapper.connection
+        wrapper.ensure_connection()
+        self.assertFalse(reconnected.closed)
+
+    def test_usable_connection_is_kept(self):
+        wrapper = self.make_wrapper(usable=True)
+        connection = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, connection)
+        self.assertFalse(connection.closed)
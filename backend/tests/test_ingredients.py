@@ -0,0 +1,104 @@
+import time
+
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+from recipes.models import Ingredient
+from recipes.search import INGREDIENT_SEARCH_LIMIT
+
+
+class IngredientSearchTest(APITestCase):
+
+    def setUp(self):
+        for name in (
+            "Квашеная капуста",
+            "Капуста",
+            "Капуста брокколи",
+            "Картофель",
+            "Морковь",
+        ):
+            Ingredient.objects.create(name=name, measurement_unit="г")
+
+    def search(self, query):
+        response = self.client.get(
+            '/api/ingredients/',
+            {'name': query},
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix_matches_first(self):
+        self.assertEquals(
+            self.search('капуст'),
+            ["Капуста", "Капуста брокколи", "Квашеная капуста"]
+        )
+
+    def test_cyrillic_case_folding(self):
+        self.assertEquals(self.search('МОРК'), ["Морковь"])
+
+    def test_no_matches(self):
+        self.assertEquals(self.search('сыр'), [])
+
+    def test_index_follows_changes(self):
+        self.assertEquals(self.search('сыр'), [])
+        Ingredient.objects.create(name="Сыр", measurement_unit="г")
+        self.assertEquals(self.search('сыр'), ["Сыр"])
+
+    def test_limit(self):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f"Соль {number}", measurement_unit="г")
+            for number in range(INGREDIENT_SEARCH_LIMIT + 5)
+        ])
+        self.assertEquals(len(self.search('соль')), INGREDIENT_SEARCH_LIMIT)
+
+
+class ReferenceDataCacheTest(APITestCase):
+
+    def setUp(self):
+        Ingredient.objects.create(name="Капуста", measurement_unit="кг")
+
+    def test_cached_list_and_etag(self):
+        response = self.client.get('/api/ingredients/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/')
+        self.assertEquals(len(response.json()), 1)
+
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_save_invalidates_cache(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        Ingredient.objects.create(name="Морковь", measurement_unit="г")
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.json()), 2)
+        self.assertNotEquals(response['ETag'], etag)
+
+    @override_settings(REFERENCE_DATA_CACHE_TIMEOUT=1)
+    def test_changes_without_version_bump_expire(self):
+        self.client.get('/api/ingredients/')
+        Ingredient.objects.update(name="Морковь")
+        time.sleep(1.05)
+        response = self.client.get('/api/ingredients/')
+        self.assertEquals(response.json()[0]['name'], "Морковь")
+
+    @override_settings(REFERENCE_DATA_CACHE_TIMEOUT=1)
+    def test_etag_survives_expiry(self):
+        etag = self.client.get('/api/ingredients/')['ETag']
+        time.sleep(1.05)
+        response = self.client.get(
+            '/api/ingredients/', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEquals(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_missing_object_not_cached(self):
+        response = self.client.get('/api/ingredients/100/')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
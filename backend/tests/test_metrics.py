@@ -0,0 +1,96 @@
+import re
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APITestCase
+from core.metrics import registry
+from recipes.models import Tag
+
+from .test_recipes import BaseRecipeTest
+
+
+class MetricsTest(APITestCase):
+
+    def setUp(self):
+        registry.clear()
+        Tag.objects.create(
+            name="Завтрак",
+            color="#E26C2D",
+            slug="breakfast"
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get('/api/recipes/')
+        response = self.client.get('/metrics/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        text = response.content.decode()
+        self.assertIn(
+            'foodgram_db_queries_count{view="RecipeViewSet.list",'
+            'method="GET"} 1',
+            text
+        )
+        self.assertIn('# TYPE foodgram_request_duration_seconds histogram',
+                      text)
+
+    @override_settings(METRICS_DEBUG_HEADERS=True)
+    def test_debug_headers(self):
+        response = self.client.get('/api/recipes/')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertTrue(int(response['X-DB-Queries']) > 0)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_forbidden(self):
+        response = self.client.get('/metrics/')
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_closed_without_allowed_ips(self):
+        response = self.client.get('/metrics/')
+        self.assertEquals(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('foodgram.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/tags/')
+        self.assertIn('TagViewSet.list', logs.output[0])
+
+
+class RecipeMetricsTest(BaseRecipeTest):
+
+    def setUp(self):
+        super().setUp()
+        registry.clear()
+        self.create_recipes(2)
+
+    def metric_sum(self, name, view):
+        match = re.search(
+            rf'{name}_sum{{view="{view}",method="GET"}} (\S+)',
+            registry.render()
+        )
+        return float(match.group(1)) if match else None
+
+    def test_serialization_time(self):
+        self.client.get('/api/recipes/')
+        self.assertTrue(
+            self.metric_sum(
+                'foodgram_serialization_duration_seconds',
+                'RecipeViewSet.list'
+            ) > 0
+        )
+
+    def test_streaming_response_queries(self):
+        view = 'RecipeViewSet.download_shopping_cart'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                '/api/recipes/download_shopping_cart/'
+            )
+            self.assertIsNone(
+                self.metric_sum('foodgram_db_queries', view)
+            )
+            b''.join(response.streaming_content)
+        self.assertEquals(
+            self.metric_sum('foodgram_db_queries', view),
+            len(context.captured_queries)
+        )
@@ -0,0 +1,142 @@
+from unittest import skipUnless
+
+from django.db import IntegrityError, connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import FeedEntry, Ingredient, Recipe, Tag
+from users.models import FollowingAuthor
+
+from .test_recipes import BaseRecipeTest
+
+
+FEED_RECIPES = 2000
+
+
+class QueryPlanTest(BaseRecipeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(3)
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах планировщик предпочитает seq scan.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def explain(self, sql, params=()):
+        if connection.vendor == 'postgresql':
+            prefix = 'EXPLAIN '
+        else:
+            prefix = 'EXPLAIN QUERY PLAN '
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(str(row) for row in cursor.fetchall())
+
+    def explain_queryset(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        return self.explain(sql, params)
+
+    def explain_endpoint(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEquals(response.status_code, 200)
+        return '\n'.join(
+            self.explain(query['sql'])
+            for query in context.captured_queries
+            if query['sql'].startswith('SELECT')
+        )
+
+    def assertUsesIndexes(self, plan, *indexes):
+        for index in indexes:
+            self.assertIn(index, plan)
+
+    def test_recipe_list(self):
+        self.assertUsesIndexes(
+            self.explain_endpoint('/api/recipes/'),
+            'recipe_pub_date_id_idx',
+            'amount_recipe_ingredient_idx',
+            'favorite_user_recipe_idx',
+            'basket_user_recipe_idx',
+        )
+        self.assertUsesIndexes(
+            self.explain_endpoint('/api/recipes/?is_favorited=1'),
+            'favorite_user_recipe_idx',
+        )
+
+    def test_recipe_cursor_page(self):
+        self.create_recipes(6)
+        response = self.client.get('/api/recipes/?cursor=')
+        next_page = response.json()['next'].replace('http://testserver', '')
+        if connection.vendor == 'postgresql':
+            bounded = 'Index Cond'
+        else:
+            bounded = 'USING INDEX recipe_pub_date_id_idx (pub_date<?)'
+        self.assertUsesIndexes(
+            self.explain_endpoint(next_page),
+            'recipe_pub_date_id_idx',
+            bounded,
+        )
+
+    def test_subscriptions(self):
+        self.assertUsesIndexes(
+            self.explain_endpoint(
+                '/api/users/subscriptions/?recipes_limit=2'
+            ),
+            'recipe_author_pub_date_idx',
+        )
+
+    def test_download_shopping_cart(self):
+        if connection.vendor == 'postgresql':
+            shopping_list_index = 'shopping_list_user_ingredient'
+        else:
+            shopping_list_index = 'sqlite_autoindex_recipes_shoppinglistitem'
+        self.assertUsesIndexes(
+            self.explain_endpoint('/api/recipes/download_shopping_cart/'),
+            'basket_user_recipe_idx',
+            shopping_list_index,
+        )
+
+    @override_settings(FEED_TIMELINE_THRESHOLD=3)
+    def test_feed_timeline(self):
+        # На ленте из нескольких строк сортировка дешевле чтения
+        # по индексу, поэтому ленту нужно наполнить.
+        author = Recipe.objects.first().author
+        Recipe.objects.bulk_create(
+            Recipe(
+                name=f'Рецепт автора {number}',
+                author=author,
+                text='Описание',
+                cooking_time=10,
+            )
+            for number in range(FEED_RECIPES)
+        )
+        FeedEntry.objects.rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {FeedEntry._meta.db_table}')
+        self.assertUsesIndexes(
+            self.explain_endpoint('/api/recipes/feed/'),
+            'feed_user_pub_date_idx',
+        )
+
+    def test_followers_of_author(self):
+        author = Recipe.objects.first().author
+        self.assertUsesIndexes(
+            self.explain_queryset(
+                FollowingAuthor.objects.filter(author=author).values('user')
+            ),
+            'following_author_user_idx',
+        )
+
+    def test_tag_slug_is_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.create(name='Ещё обед', slug='lunch')
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_ingredient_prefix_search(self):
+        self.assertUsesIndexes(
+            self.explain_queryset(
+                Ingredient.objects.filter(name__istartswith='кап')
+            ),
+            'recipes_ingredient_name_pattern',
+        )
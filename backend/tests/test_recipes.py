@@ -0,0 +1,956 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+from recipes.interactions import UserInteractions, cache_key
+from recipes.models import (
+    BasketRecipe,
+    FavoriteRecipe,
+    FeedEntry,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    ShoppingListItem,
+    Tag,
+)
+from users.models import (
+    FollowingAuthor
+)
+
+
+User = get_user_model()
+
+
+class BaseRecipeTest(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(
+            email="qwerty@yandex.ru",
+            username="ya",
+            first_name="ya",
+            last_name="ya",
+            password="Qwerty123qwe123"
+        )
+        self.tags = [
+            Tag.objects.create(
+                name="Завтрак",
+                color="#E26C2D",
+                slug="breakfast"
+            ),
+            Tag.objects.create(
+                name="Обед",
+                color="#49B64E",
+                slug="lunch"
+            ),
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(
+                name="Капуста",
+                measurement_unit="кг"
+            ),
+            Ingredient.objects.create(
+                name="Морковь",
+                measurement_unit="г"
+            ),
+        ]
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        for number in range(count):
+            author = User.objects.create(
+                email=f"author{Recipe.objects.count()}@yandex.ru",
+                username=f"author{Recipe.objects.count()}",
+                first_name="author",
+                last_name="author",
+                password="Qwerty123qwe123"
+            )
+            recipe = Recipe.objects.create(
+                name=f"Рецепт {number}",
+                author=author,
+                text="Описание",
+                cooking_time=10
+            )
+            recipe.tags.set(self.tags)
+            IngredientAmount.objects.bulk_create([
+                IngredientAmount(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+                for ingredient in self.ingredients
+            ])
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+            BasketRecipe.objects.create(user=self.user, recipe=recipe)
+            FollowingAuthor.objects.create(user=self.user, author=author)
+
+
+class RecipeListQueriesTest(BaseRecipeTest):
+
+    def count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/recipes/', format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), response.json()
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self.create_recipes(1)
+        small_page_queries, res = self.count_list_queries()
+        self.assertEquals(len(res['results']), 1)
+
+        self.create_recipes(5)
+        full_page_queries, res = self.count_list_queries()
+        self.assertEquals(len(res['results']), 6)
+        self.assertEquals(small_page_queries, full_page_queries)
+
+        recipe = res['results'][0]
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEquals(len(recipe['tags']), 2)
+        self.assertEquals(len(recipe['ingredients']), 2)
+
+    def test_anonymous_list_flags(self):
+        self.create_recipes(2)
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/', format='json')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        for recipe in response.json()['results']:
+            self.assertFalse(recipe['is_favorited'])
+            self.assertFalse(recipe['is_in_shopping_cart'])
+            self.assertFalse(recipe['author']['is_subscribed'])
+
+
+class DownloadShoppingCartTest(BaseRecipeTest):
+
+    def download(self, file_format=None):
+        url = '/api/recipes/download_shopping_cart/'
+        if file_format:
+            url = f'{url}?format={file_format}'
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response, content, len(context.captured_queries)
+
+    def test_download_empty_cart(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_download_txt(self):
+        self.create_recipes(1)
+        _, _, small_cart_queries = self.download()
+        self.create_recipes(4)
+        response, content, queries = self.download()
+        self.assertEquals(small_cart_queries, queries)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn('shopping_list.txt', response['Content-Disposition'])
+        text = content.decode('utf-8')
+        self.assertIn('Рецепт 3', text)
+        self.assertIn('Капуста - кг, 5', text)
+
+    def test_download_csv(self):
+        self.create_recipes(2)
+        response, content, _ = self.download('csv')
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+        self.assertIn('Морковь,г,2', content.decode('utf-8'))
+
+    def test_download_pdf(self):
+        self.create_recipes(2)
+        response, content, _ = self.download('pdf')
+        self.assertTrue(
+            response['Content-Type'].startswith('application/pdf')
+        )
+        self.assertTrue(content.startswith(b'%PDF'))
+
+    def test_download_format_overrides_accept(self):
+        self.create_recipes(1)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=csv',
+            HTTP_ACCEPT='application/json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/csv'))
+
+    def test_download_unknown_format(self):
+        self.create_recipes(1)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=xlsx'
+        )
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('Content-Disposition', response)
+
+
+class SubscriptionsTest(BaseRecipeTest):
+
+    def get_subscriptions(self, query=''):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/api/users/subscriptions/{query}')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.json(), len(context.captured_queries)
+
+    def test_queries_do_not_grow_with_page_size(self):
+        self.create_recipes(1)
+        _, small_page_queries = self.get_subscriptions()
+        self.create_recipes(5)
+        res, full_page_queries = self.get_subscriptions()
+        self.assertEquals(small_page_queries, full_page_queries)
+        self.assertEquals(res['count'], 6)
+        self.assertEquals(len(res['results']), 6)
+        author = res['results'][0]
+        self.assertTrue(author['is_subscribed'])
+        self.assertEquals(author['recipes_count'], 1)
+
+    def test_recipes_limit(self):
+        self.create_recipes(1)
+        author = Recipe.objects.get().author
+        for number in range(3):
+            Recipe.objects.create(
+                name=f"Ещё рецепт {number}",
+                author=author,
+                text="Описание",
+                cooking_time=10
+            )
+        res, _ = self.get_subscriptions('?recipes_limit=2')
+        result = res['results'][0]
+        self.assertEquals(result['recipes_count'], 4)
+        self.assertEquals(
+            [recipe['name'] for recipe in result['recipes']],
+            ["Ещё рецепт 2", "Ещё рецепт 1"]
+        )
+
+
+class RecipeCountersTest(BaseRecipeTest):
+
+    def test_favorite_and_cart_counters(self):
+        self.create_recipes(2)
+        recipe = Recipe.objects.last()
+        FavoriteRecipe.objects.all().delete()
+        BasketRecipe.objects.all().delete()
+        Recipe.objects.update(favorites_count=0, carts_count=0)
+
+        response = self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        recipe.refresh_from_db()
+        self.assertEquals(recipe.favorites_count, 1)
+        self.assertEquals(recipe.carts_count, 1)
+
+        response = self.client.get('/api/recipes/?ordering=-favorites_count')
+        result = response.json()['results'][0]
+        self.assertEquals(result['id'], recipe.id)
+        self.assertEquals(result['favorites_count'], 1)
+
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        response = self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEquals(recipe.favorites_count, 0)
+
+    def test_drifted_counter_stays_non_negative(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        Recipe.objects.update(carts_count=0)
+        response = self.client.delete(
+            f'/api/recipes/{recipe.id}/shopping_cart/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        recipe.refresh_from_db()
+        self.assertEquals(recipe.carts_count, 0)
+
+    def test_reconcile_counters(self):
+        self.create_recipes(3)
+        Recipe.objects.update(favorites_count=10)
+        self.assertEquals(Recipe.objects.reconcile_counters(), 3)
+        self.assertEquals(Recipe.objects.reconcile_counters(), 0)
+        self.assertFalse(Recipe.objects.exclude(favorites_count=1).exists())
+
+
+class RecipeCursorPaginationTest(BaseRecipeTest):
+
+    def test_cursor_pages(self):
+        self.create_recipes(8)
+        expected = list(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'id', flat=True
+            )
+        )
+        response = self.client.get('/api/recipes/?cursor=')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        res = response.json()
+        self.assertNotIn('count', res)
+        ids = [recipe['id'] for recipe in res['results']]
+
+        response = self.client.get(f"{res['next']}&count=exact")
+        res = response.json()
+        self.assertEquals(res['count'], 8)
+        self.assertIsNone(res['next'])
+        ids += [recipe['id'] for recipe in res['results']]
+        self.assertEquals(ids, expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=qwerty')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_with_other_ordering(self):
+        self.create_recipes(2)
+        for query in ('ordering=favorites_count', 'search=Рецепт'):
+            response = self.client.get(f'/api/recipes/?cursor=&{query}')
+            self.assertEquals(
+                response.status_code, status.HTTP_400_BAD_REQUEST
+            )
+            self.assertIn('cursor', response.json())
+        response = self.client.get('/api/recipes/?cursor=&ordering=-pub_date')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(len(response.json()['results']), 2)
+
+    def test_page_number_pagination_by_default(self):
+        self.create_recipes(1)
+        res = self.client.get('/api/recipes/').json()
+        self.assertEquals(res['count'], 1)
+        self.assertIn('previous', res)
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    IMAGE_PROCESSING_ASYNC=False,
+)
+class BaseRecipeWriteTest(BaseRecipeTest):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def image_data(self, size=(1200, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, color='red').save(buffer, 'PNG')
+        encoded = base64.b64encode(buffer.getvalue()).decode()
+        return f'data:image/png;base64,{encoded}'
+
+    def recipe_data(self, image, ingredients=None):
+        return {
+            'ingredients': ingredients or [
+                {'id': self.ingredients[0].id, 'amount': 10}
+            ],
+            'tags': [self.tags[0].id],
+            'image': image,
+            'name': 'Рецепт с фото',
+            'text': 'Описание',
+            'cooking_time': 5,
+        }
+
+    def post_recipe(self, ingredients):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                '/api/recipes/',
+                self.recipe_data(self.image_data((10, 10)), ingredients),
+                format='json'
+            )
+        return response, len(context.captured_queries)
+
+
+class RecipeImageTest(BaseRecipeWriteTest):
+
+    def test_create_recipe_builds_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/',
+                self.recipe_data(self.image_data()),
+                format='json'
+            )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=response.json()['id'])
+        self.assertEquals(
+            set(recipe.image_variants), {'thumbnail', 'webp'}
+        )
+        with Image.open(
+            f"{TEMP_MEDIA_ROOT}/{recipe.image_variants['thumbnail']}"
+        ) as thumbnail:
+            self.assertEquals(thumbnail.format, 'WEBP')
+            self.assertEquals(thumbnail.size, (480, 320))
+
+        res = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertTrue(
+            res['image_variants']['thumbnail'].endswith('_thumbnail.webp')
+        )
+
+    def create_with_image(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/',
+                self.recipe_data(self.image_data()),
+                format='json'
+            )
+        return Recipe.objects.get(pk=response.json()['id'])
+
+    def test_replace_image_deletes_old_variants(self):
+        recipe = self.create_with_image()
+        old_variants = recipe.image_variants
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {'image': self.image_data((600, 600))},
+                format='json'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        self.assertEquals(set(recipe.image_variants), {'thumbnail', 'webp'})
+        for name in old_variants.values():
+            self.assertFalse(default_storage.exists(name))
+        for name in recipe.image_variants.values():
+            self.assertTrue(default_storage.exists(name))
+
+    def test_regenerate_missing_variants(self):
+        recipe = self.create_with_image()
+        default_storage.delete(recipe.image_variants['webp'])
+        other = self.create_with_image()
+        Recipe.objects.filter(pk=other.pk).update(image_variants={})
+        out = io.StringIO()
+        call_command('regenerate_image_variants', stdout=out)
+        self.assertIn('recipes: 2', out.getvalue())
+        for pk in (recipe.pk, other.pk):
+            variants = Recipe.objects.get(pk=pk).image_variants
+            self.assertEquals(set(variants), {'thumbnail', 'webp'})
+            for name in variants.values():
+                self.assertTrue(default_storage.exists(name))
+        out = io.StringIO()
+        call_command('regenerate_image_variants', stdout=out)
+        self.assertIn('recipes: 0', out.getvalue())
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=100)
+    def test_image_size_limit(self):
+        response = self.client.post(
+            '/api/recipes/',
+            self.recipe_data(self.image_data()),
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.json())
+
+
+class RecipeWriteTest(BaseRecipeWriteTest):
+
+    def test_create_queries_do_not_grow_with_ingredients(self):
+        response, few_queries = self.post_recipe(
+            [{'id': self.ingredients[0].id, 'amount': 1}]
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        response, many_queries = self.post_recipe([
+            {'id': ingredient.id, 'amount': 1}
+            for ingredient in self.ingredients
+        ])
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(few_queries, many_queries)
+        self.assertEquals(len(response.json()['ingredients']), 2)
+
+    def test_duplicate_ingredients_merged(self):
+        ingredient = self.ingredients[0]
+        response, _ = self.post_recipe([
+            {'id': ingredient.id, 'amount': 2},
+            {'id': ingredient.id, 'amount': 3},
+        ])
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertEquals(
+            response.json()['ingredients'][0]['amount'], 5
+        )
+
+    def test_missing_ingredients(self):
+        response, _ = self.post_recipe([
+            {'id': self.ingredients[0].id, 'amount': 1},
+            {'id': 1000, 'amount': 1},
+        ])
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEquals(
+            response.json()['ingredients']['missing_ids'], [1000]
+        )
+
+    def test_merged_amount_limit(self):
+        ingredient = self.ingredients[0]
+        response, _ = self.post_recipe([
+            {'id': ingredient.id, 'amount': 20000},
+            {'id': ingredient.id, 'amount': 20000},
+        ])
+        self.assertEquals(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients', response.json())
+
+    def test_update_changes_only_diff(self):
+        response, _ = self.post_recipe([
+            {'id': self.ingredients[0].id, 'amount': 1},
+            {'id': self.ingredients[1].id, 'amount': 2},
+        ])
+        recipe_id = response.json()['id']
+        kept = IngredientAmount.objects.get(
+            recipe_id=recipe_id, ingredient=self.ingredients[0]
+        )
+        beet = Ingredient.objects.create(
+            name="Свёкла", measurement_unit="г"
+        )
+        response = self.client.patch(
+            f'/api/recipes/{recipe_id}/',
+            {
+                'ingredients': [
+                    {'id': self.ingredients[0].id, 'amount': 1},
+                    {'id': beet.id, 'amount': 3},
+                ],
+                'tags': [self.tags[1].id],
+                'name': 'Новое название',
+            },
+            format='json'
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        res = response.json()
+        self.assertEquals(res['name'], 'Новое название')
+        self.assertEquals([tag['id'] for tag in res['tags']],
+                          [self.tags[1].id])
+        self.assertEquals(
+            sorted(
+                (item['id'], item['amount']) for item in res['ingredients']
+            ),
+            [(self.ingredients[0].id, 1), (beet.id, 3)]
+        )
+        self.assertTrue(IngredientAmount.objects.filter(pk=kept.pk).exists())
+
+
+@override_settings(USER_INTERACTIONS_CACHE_TIMEOUT=60)
+class UserInteractionsCacheTest(BaseRecipeTest):
+
+    def test_cached_flags_follow_writes(self):
+        self.create_recipes(2)
+        recipe = Recipe.objects.first()
+        FavoriteRecipe.objects.filter(recipe=recipe).delete()
+        FollowingAuthor.objects.filter(author=recipe.author).delete()
+        Recipe.objects.reconcile_counters()
+
+        result = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertFalse(result['is_favorited'])
+        self.assertFalse(result['author']['is_subscribed'])
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(f'/api/recipes/{recipe.id}/')
+        with override_settings(USER_INTERACTIONS_CACHE_TIMEOUT=0):
+            with CaptureQueriesContext(connection) as uncached:
+                self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEquals(
+            len(uncached.captured_queries) - len(cached.captured_queries), 3
+        )
+
+        self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.post(f'/api/users/{recipe.author.id}/subscribe/')
+        result = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertTrue(result['is_favorited'])
+        self.assertTrue(result['author']['is_subscribed'])
+
+        self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        result = self.client.get(f'/api/recipes/{recipe.id}/').json()
+        self.assertFalse(result['is_in_shopping_cart'])
+
+    def test_cache_reset_after_commit(self):
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        FavoriteRecipe.objects.filter(recipe=recipe).delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            FavoriteRecipe.objects.create(user=self.user, recipe=recipe)
+            # Параллельный запрос читает данные до коммита.
+            cache.set(cache_key(self.user.pk), UserInteractions())
+        self.assertIsNone(cache.get(cache_key(self.user.pk)))
+
+
+class RecipeSearchTest(BaseRecipeWriteTest):
+
+    def test_search(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_recipe([{'id': self.ingredients[1].id, 'amount': 1}])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f"/api/recipes/{Recipe.objects.get().id}/",
+                {'name': 'Морковный пирог'},
+                format='json'
+            )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_recipe([{'id': self.ingredients[0].id, 'amount': 1}])
+
+        res = self.client.get('/api/recipes/?search=пироги').json()
+        self.assertEquals(
+            [recipe['name'] for recipe in res['results']],
+            ['Морковный пирог']
+        )
+        res = self.client.get('/api/recipes/?search=капуста').json()
+        self.assertEquals(len(res['results']), 1)
+        self.assertEquals(res['results'][0]['name'], 'Рецепт с фото')
+        res = self.client.get('/api/recipes/?search=сыр').json()
+        self.assertEquals(res['count'], 0)
+
+    def test_ranking(self):
+        for name, text, ingredient in (
+            ('Суп', 'Морковь по вкусу', self.ingredients[0]),
+            ('Морковь тушёная', 'Описание', self.ingredients[0]),
+            ('Салат', 'Описание', self.ingredients[1]),
+        ):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = Recipe.objects.create(
+                    name=name, author=self.user, text=text, cooking_time=5
+                )
+                IngredientAmount.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+        self.assertEquals(
+            self.search_names('морковь'),
+            ['Морковь тушёная', 'Суп', 'Салат']
+        )
+
+    def search_names(self, query):
+        res = self.client.get(f'/api/recipes/?search={query}').json()
+        return [recipe['name'] for recipe in res['results']]
+
+    def test_model_writes_update_search(self):
+        self.assertEquals(self.search_names('сырник'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                name='Сырники', author=self.user, text='Описание',
+                cooking_time=5
+            )
+        self.assertEquals(self.search_names('сырник'), ['Сырники'])
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientAmount.objects.create(
+                recipe=recipe, ingredient=self.ingredients[0], amount=1
+            )
+        self.assertEquals(self.search_names('капуста'), ['Сырники'])
+
+        ingredient = self.ingredients[0]
+        ingredient.name = 'Творог'
+        ingredient.save()
+        self.assertEquals(self.search_names('творог'), ['Сырники'])
+        self.assertEquals(self.search_names('капуста'), [])
+
+    def test_ingredient_changes_refresh_vector_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_recipe([
+                {'id': ingredient.id, 'amount': 1}
+                for ingredient in self.ingredients
+            ])
+        recipe = Recipe.objects.get()
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(
+                    f'/api/recipes/{recipe.id}/',
+                    {'ingredients': [
+                        {'id': self.ingredients[0].id, 'amount': 2}
+                    ]},
+                    format='json'
+                )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        updates = [
+            query for query in context.captured_queries
+            if 'to_tsvector' in query['sql']
+        ]
+        self.assertTrue(len(updates) <= 1)
+        self.assertEquals(self.search_names('морковь'), [])
+
+
+class RecipeTagFilterTest(BaseRecipeTest):
+
+    def test_tags_filter_without_duplicates(self):
+        self.create_recipes(2)
+        lunch_only = Recipe.objects.first()
+        lunch_only.tags.set([self.tags[1]])
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(
+                '/api/recipes/?tags=breakfast&tags=lunch'
+            ).json()
+        self.assertEquals(res['count'], 2)
+        self.assertEquals(len(res['results']), 2)
+        self.assertFalse(any(
+            'DISTINCT' in query['sql'] for query in context.captured_queries
+        ))
+
+        res = self.client.get('/api/recipes/?tags=breakfast').json()
+        self.assertEquals(res['count'], 1)
+        res = self.client.get('/api/recipes/?tags=unknown').json()
+        self.assertEquals(res['count'], 0)
+
+
+class RecipeResponseCacheTest(BaseRecipeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(2)
+        self.recipe = Recipe.objects.first()
+        self.client.force_authenticate(None)
+
+    def test_anonymous_list_cached(self):
+        response = self.client.get('/api/recipes/?limit=6&page=1')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/recipes/?page=1&limit=6')
+        self.assertEquals(cached.content, response.content)
+        self.assertEquals(cached['ETag'], response['ETag'])
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(
+                '/api/recipes/?page=1&limit=6',
+                HTTP_IF_NONE_MATCH=response['ETag'],
+            )
+        self.assertEquals(
+            not_modified.status_code, status.HTTP_304_NOT_MODIFIED
+        )
+
+    def test_write_invalidates_recipe_and_list(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.get('/api/recipes/')
+        etag = self.client.get(url)['ETag']
+        other = Recipe.objects.exclude(pk=self.recipe.pk).get()
+        self.client.get(f'/api/recipes/{other.id}/')
+
+        self.recipe.name = 'Новое название'
+        self.recipe.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(response.json()['name'], 'Новое название')
+        names = [
+            recipe['name']
+            for recipe in self.client.get('/api/recipes/').json()['results']
+        ]
+        self.assertIn('Новое название', names)
+        with self.assertNumQueries(0):
+            self.client.get(f'/api/recipes/{other.id}/')
+
+    def test_favorite_keeps_cached_list(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.get('/api/recipes/')
+        self.client.get(url)
+        other = User.objects.create(email='other@yandex.ru', username='other')
+        FavoriteRecipe.objects.create(user=other, recipe=self.recipe)
+        with self.assertNumQueries(0):
+            self.client.get('/api/recipes/')
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        self.assertTrue(context.captured_queries)
+
+    def test_if_none_match_list(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        etag = self.client.get(url)['ETag']
+        for header, expected in (
+            (f'"other", {etag}', status.HTTP_304_NOT_MODIFIED),
+            (f'W/{etag}', status.HTTP_304_NOT_MODIFIED),
+            ('*', status.HTTP_304_NOT_MODIFIED),
+            ('"other"', status.HTTP_200_OK),
+            (f'{etag[:-2]}"', status.HTTP_200_OK),
+            (f'"x{etag[1:]}', status.HTTP_200_OK),
+        ):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=header)
+            self.assertEquals(response.status_code, expected, header)
+
+    def test_author_change_invalidates_recipes(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.get(url)
+        author = self.recipe.author
+        author.first_name = 'Новое'
+        author.save()
+        response = self.client.get(url)
+        self.assertEquals(response.json()['author']['first_name'], 'Новое')
+
+    def test_authenticated_not_cached(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertFalse(self.client.get(url).json()['is_favorited'])
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('ETag', response)
+        self.assertTrue(response.json()['is_favorited'])
+
+
+class ShoppingListTest(BaseRecipeWriteTest):
+
+    def setUp(self):
+        super().setUp()
+        self.recipe = self.post_recipe([
+            {'id': self.ingredients[0].id, 'amount': 2},
+            {'id': self.ingredients[1].id, 'amount': 3},
+        ])[0].json()
+        self.other = self.post_recipe([
+            {'id': self.ingredients[0].id, 'amount': 5},
+        ])[0].json()
+
+    def shopping_list(self):
+        response = self.client.get('/api/recipes/shopping_list/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return {item['name']: item['amount'] for item in response.json()}
+
+    def add_to_cart(self, recipe):
+        response = self.client.post(
+            f'/api/recipes/{recipe["id"]}/shopping_cart/'
+        )
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+
+    def test_cart_changes(self):
+        self.assertEquals(self.shopping_list(), {})
+        self.add_to_cart(self.recipe)
+        self.add_to_cart(self.other)
+        self.assertEquals(
+            self.shopping_list(), {'Капуста': 7, 'Морковь': 3}
+        )
+        self.client.delete(
+            f'/api/recipes/{self.recipe["id"]}/shopping_cart/'
+        )
+        self.assertEquals(self.shopping_list(), {'Капуста': 5})
+
+    def test_recipe_ingredients_update(self):
+        self.add_to_cart(self.recipe)
+        self.add_to_cart(self.other)
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe["id"]}/',
+            {'ingredients': [{'id': self.ingredients[0].id, 'amount': 1}]},
+            format='json',
+        )
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        self.assertEquals(self.shopping_list(), {'Капуста': 6})
+        self.assertEquals(
+            ShoppingListItem.objects.rebuild(),
+            ShoppingListItem.objects.count(),
+        )
+        self.assertEquals(self.shopping_list(), {'Капуста': 6})
+
+    def test_rebuild_for_user(self):
+        self.add_to_cart(self.recipe)
+        other_user = User.objects.create(
+            email='other@yandex.ru', username='other'
+        )
+        BasketRecipe.objects.create(
+            user=other_user, recipe_id=self.recipe['id']
+        )
+        expected = self.shopping_list()
+        ShoppingListItem.objects.rebuild([self.user.pk])
+        self.assertEquals(self.shopping_list(), expected)
+
+    def test_recipe_delete(self):
+        self.add_to_cart(self.recipe)
+        self.add_to_cart(self.other)
+        response = self.client.delete(f'/api/recipes/{self.other["id"]}/')
+        self.assertEquals(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEquals(
+            self.shopping_list(), {'Капуста': 2, 'Морковь': 3}
+        )
+
+    def test_recipe_delete_queries_do_not_grow_with_carts(self):
+        users = [
+            User.objects.create(
+                email=f'user{number}@yandex.ru', username=f'user{number}'
+            )
+            for number in range(5)
+        ]
+        single = self.post_recipe([
+            {'id': self.ingredients[0].id, 'amount': 5},
+        ])[0].json()
+        BasketRecipe.objects.create(user=self.user, recipe_id=single['id'])
+        for user in users:
+            BasketRecipe.objects.create(user=user, recipe_id=self.other['id'])
+        queries = []
+        for recipe in (single, self.other):
+            with CaptureQueriesContext(connection) as context:
+                Recipe.objects.get(pk=recipe['id']).delete()
+            queries.append(len(context.captured_queries))
+        self.assertEquals(queries[0], queries[1])
+        self.assertFalse(ShoppingListItem.objects.exists())
+
+    def test_download_reads_materialized_list(self):
+        self.add_to_cart(self.recipe)
+        ShoppingListItem.objects.filter(
+            ingredient=self.ingredients[1]
+        ).update(amount=42)
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        text = b''.join(response.streaming_content).decode()
+        self.assertIn('Морковь - г, 42', text)
+
+
+class FeedTest(BaseRecipeTest):
+
+    def setUp(self):
+        super().setUp()
+        self.create_recipes(8)
+        FollowingAuthor.objects.filter(
+            author__recipes__name='Рецепт 7'
+        ).delete()
+        self.expected = list(
+            Recipe.objects.exclude(name='Рецепт 7').order_by(
+                '-pub_date', '-id'
+            ).values_list('id', flat=True)
+        )
+
+    def read_feed(self, url='/api/recipes/feed/'):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEquals(response.status_code, status.HTTP_200_OK)
+            res = response.json()
+            self.assertNotIn('count', res)
+            ids += [recipe['id'] for recipe in res['results']]
+            url = res['next']
+        return ids
+
+    def test_feed_of_followed_authors(self):
+        self.assertEquals(self.read_feed(), self.expected)
+        self.assertEquals(
+            self.client.get('/api/recipes/feed/?count=exact').json()['count'],
+            7
+        )
+        self.assertFalse(FeedEntry.objects.exists())
+        self.client.force_authenticate(None)
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEquals(
+            response.status_code, status.HTTP_401_UNAUTHORIZED
+        )
+
+    @override_settings(FEED_TIMELINE_THRESHOLD=7)
+    def test_materialized_timeline(self):
+        self.assertEquals(FeedEntry.objects.rebuild(), 7)
+        self.assertEquals(self.read_feed(), self.expected)
+
+        author = Recipe.objects.get(name='Рецепт 7').author
+        FollowingAuthor.objects.create(user=self.user, author=author)
+        self.assertEquals(FeedEntry.objects.count(), 8)
+        self.assertEquals(
+            FeedEntry.objects.timeline_followers(author.pk), [self.user.pk]
+        )
+        with override_settings(FEED_TIMELINE_THRESHOLD=9):
+            self.assertEquals(
+                FeedEntry.objects.timeline_followers(author.pk), []
+            )
+        recipe = Recipe.objects.create(
+            name='Новый', author=author, text='Описание', cooking_time=5
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, recipe=recipe).exists()
+        )
+        feed = self.read_feed()
+        self.assertEquals(feed[0], recipe.id)
+        self.assertEquals(len(feed), 9)
+
+        FollowingAuthor.objects.filter(author=author).delete()
+        self.assertEquals(self.read_feed(), self.expected)
+        self.assertEquals(FeedEntry.objects.count(), 7)
+        FollowingAuthor.objects.filter(user=self.user).first().delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEquals(len(self.read_feed()), 6)
+
+    @override_settings(FEED_TIMELINE_THRESHOLD=7)
+    def test_timeline_crosses_threshold(self):
+        FollowingAuthor.objects.filter(user=self.user).first().delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        author = Recipe.objects.get(name='Рецепт 7').author
+        FollowingAuthor.objects.create(user=self.user, author=author)
+        self.assertEquals(FeedEntry.objects.count(), 7)
@@ -0,0 +1,134 @@
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+from core.checks import check_replica_pin_cache
+from core.db.routers import reset_replica, use_replica
+from recipes.models import Recipe, Tag, User
+
+
+REPLICA = 'replica'
+
+
+@override_settings(READ_REPLICAS=[REPLICA], REPLICA_STICKINESS_SECONDS=60)
+class ReplicaRoutingTest(APITransactionTestCase):
+    """
+        Реплика - отдельная SQLite БД, в которую данные
+        записываются напрямую, имитируя отставание репликации.
+        Она подключается после проверок тестового раннера,
+        поэтому не входит в databases.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+            'TEST': {'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3')},
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        call_command('migrate', database=REPLICA, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        os.remove(os.path.join(cls.replica_dir, 'replica.sqlite3'))
+        os.rmdir(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        for database, name in (('default', 'Основной'), (REPLICA, 'Копия')):
+            user = User.objects.db_manager(database).create(
+                pk=1, email='reader@yandex.ru', username='reader'
+            )
+            author = User.objects.db_manager(database).create(
+                pk=2, email='author@yandex.ru', username='author'
+            )
+            Recipe.objects.db_manager(database).create(
+                pk=1, name=name, author=author, text='Текст', cooking_time=5
+            )
+        self.user = user
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        call_command(
+            'flush', database=REPLICA, interactive=False, verbosity=0
+        )
+        super().tearDown()
+
+    def get_recipe_name(self):
+        response = self.client.get('/api/recipes/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+        return response.json()['results'][0]['name']
+
+    def test_reads_go_to_replica(self):
+        self.assertEquals(self.get_recipe_name(), 'Копия')
+        response = self.client.get('/api/users/me/')
+        self.assertEquals(response.status_code, status.HTTP_200_OK)
+
+    def test_read_your_writes(self):
+        response = self.client.post('/api/recipes/1/favorite/')
+        self.assertEquals(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(
+            self.user.favorites.using('default').filter(recipe=1).exists()
+        )
+        self.assertFalse(
+            self.user.favorites.using(REPLICA).filter(recipe=1).exists()
+        )
+        self.assertEquals(self.get_recipe_name(), 'Основной')
+        self.client.force_authenticate(User.objects.get(pk=2))
+        self.assertEquals(self.get_recipe_name(), 'Копия')
+
+    def test_failed_write_does_not_pin(self):
+        response = self.client.post('/api/recipes/100/favorite/')
+        self.assertEquals(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEquals(self.get_recipe_name(), 'Копия')
+
+    @override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=300)
+    def test_anonymous_cache_is_filled_from_primary(self):
+        self.client.force_authenticate(None)
+        self.assertEquals(self.get_recipe_name(), 'Основной')
+        Recipe.objects.filter(pk=1).update(name='Новый')
+        self.assertEquals(self.get_recipe_name(), 'Основной')
+        self.client.force_authenticate(self.user)
+        self.assertEquals(self.get_recipe_name(), 'Копия')
+
+    def test_shared_cache_check(self):
+        self.assertEquals(
+            [error.id for error in check_replica_pin_cache(None)],
+            ['core.E001']
+        )
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache',
+        }}):
+            self.assertEquals(check_replica_pin_cache(None), [])
+
+    def test_router(self):
+        Tag.objects.using(REPLICA).create(
+            name='Ужин', color='#8775D2', slug='dinner'
+        )
+        token = use_replica(self.user)
+        try:
+            self.assertTrue(Tag.objects.filter(slug='dinner').exists())
+            with transaction.atomic():
+                self.assertFalse(Tag.objects.filter(slug='dinner').exists())
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        finally:
+            reset_replica(token)
+        self.assertFalse(Tag.objects.filter(slug='dinner').exists())
+        self.assertTrue(Tag.objects.filter(slug='lunch').exists())
+        self.assertFalse(
+            Tag.objects.using(REPLICA).filter(slug='lunch').exists()
+        )
@@ -62,12 +62,14 @@ class FollowingAuthor(models.Model):
         on_delete=models.CASCADE,
         related_name='follower',
         verbose_name='Пользователь',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         related_name='following',
         verbose_name='Автор',
+        db_index=False,
     )
 
     class Meta:
@@ -77,6 +79,12 @@ class FollowingAuthor(models.Model):
                 name='На автора можно подпписаться только 1 раз!'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='following_author_user_idx',
+            )
+        ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 